@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'onlineStore.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'onlineStore.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'ninja-api.urls'
@@ -78,9 +80,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite (onlineStore.signals).
+# Пустой словарь отключает настройку.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -122,3 +142,108 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Кэш проверенных учетных данных BasicAuth (onlineStore.auth).
+# Изменения пользователя из других процессов видны через API_TOKENS.GENERATION_TTL секунд.
+
+AUTH_CREDENTIAL_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 300,
+}
+
+# Кэш прав пользователей для проверок в API (onlineStore.permissions)
+
+AUTH_PERMISSION_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 300,
+}
+
+# Подписанные токены доступа (onlineStore.tokens), время жизни в секундах.
+# Поколения токенов хранятся в БД, GENERATION_TTL - сколько секунд процесс держит их у себя:
+# за это время отзыв становится виден в остальных процессах.
+
+API_TOKENS = {
+    'ACCESS_TTL': 900,
+    'REFRESH_TTL': 7 * 24 * 3600,
+    'GENERATION_TTL': 5,
+    'GENERATION_CACHE_SIZE': 10_000,
+}
+
+# Курсорная пагинация списков API (onlineStore.pagination)
+
+API_PAGINATION = {
+    'DEFAULT_LIMIT': 100,
+    'MAX_LIMIT': 1000,
+    'STREAM_CHUNK_SIZE': 2000,
+}
+
+# Кэш каталога: LRU внутри процесса перед кэшем Django (onlineStore.cache).
+# Поколения каталога и заказов для ключей и ETag лежат в БД, процесс держит их GENERATION_TTL секунд.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'TTL': 300,
+    'LOCAL_MAX_SIZE': 1024,
+    'LOCAL_TTL': 30,
+    'GENERATION_TTL': 1,
+    'GENERATION_CACHE_SIZE': 10_000,
+}
+
+# Метрики API и журнал медленных запросов (onlineStore.metrics).
+# SLOW_REQUEST_SECONDS = None отключает журнал.
+
+API_METRICS = {
+    'PATH_PREFIX': '/api/',
+    'SLOW_REQUEST_SECONDS': 1.0,
+    'MAX_LOGGED_QUERIES': 50,
+}
+
+# Индекс цен внутри процесса для фильтра продуктов (onlineStore.price_index).
+# MAX_AGE - через сколько секунд индекс перестраивается из БД,
+# MAX_ROWS - при большем числе найденных продуктов используется запрос к БД.
+
+PRICE_INDEX = {
+    'ENABLED': True,
+    'MAX_AGE': 300,
+    'MAX_ROWS': 5000,
+}
+
+# Подсказки по названиям продуктов (onlineStore.suggest).
+# Основа индекса строится в фоне и перестраивается через MAX_AGE секунд или после MAX_PENDING изменений,
+# пока ее нет (сразу после запуска или импорта), подсказки пустые.
+
+PRODUCT_SUGGEST = {
+    'MAX_AGE': 3600,
+    'MAX_PENDING': 500,
+    'DEFAULT_LIMIT': 10,
+    'MAX_LIMIT': 50,
+}
+
+# Сжатие ответов API в gzip (onlineStore.compression).
+# Ответы короче MIN_SIZE байт не сжимаются.
+
+API_COMPRESSION = {
+    'PATH_PREFIX': '/api/',
+    'MIN_SIZE': 1024,
+    'LEVEL': 6,
+}
+
+# Статусы заказов, не учитываемые в статистике продаж (onlineStore.stats)
+
+STATS_EXCLUDED_STATUSES = ['Отменен']
+
+# "Часто покупают вместе" (onlineStore.related): число соседей у продукта
+# и максимальный размер заказа, пары из которого учитываются.
+# REBUILD_RANGE_SIZE - сколько продуктов пересчитывается в одной транзакции при полном пересчете.
+
+RELATED_PRODUCTS = {
+    'TOP_K': 10,
+    'MAX_ORDER_PRODUCTS': 50,
+    'REBUILD_RANGE_SIZE': 2000,
+}
@@ -1,17 +1,35 @@
 from ninja import NinjaAPI, Schema
-from .models import Category, Product, WishList, Order, OrderProduct
+from .models import Category, Product, WishList, Order, OrderProduct, DailyRevenue, CategoryRevenue, ProductRevenue, CategoryStats
 from typing import List
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import permission_required
 from ninja.errors import HttpError
-from ninja import Query
-from datetime import datetime
+from ninja import Query, File
+from ninja.files import UploadedFile
+from datetime import date, datetime
 from ninja.security import HttpBasicAuth
-
-
-api = NinjaAPI(csrf=True)
+from .auth import credential_cache
+from .tokens import TokenAuth, issue_tokens, refresh_tokens, revoke_user_tokens
+from .permissions import permission_cache, require_perm
+from .pagination import MAX_LIMIT, PageParams, paginate_or_stream
+from .renderers import ORJSONRenderer, parse_fields, render_rows, values_plan
+from .search import search_products
+from .suggest import DEFAULT_LIMIT as SUGGEST_LIMIT, MAX_LIMIT as SUGGEST_MAX_LIMIT, suggest_index
+from .price_index import ENABLED as PRICE_INDEX_ENABLED, MAX_ROWS as PRICE_INDEX_MAX_ROWS, price_index
+from .importer import FORMATS, detect_format, import_products
+from .exporter import FORMATS as EXPORT_FORMATS, export_response
+from .cache import catalog_cache, orders_generation
+from .metrics import registry
+from .conditional import conditional_get, catalog_version, orders_version, products_filter_version
+from .stats import apply_new_order, apply_status_change
+from .related import record_order, record_status_change
+from django.http import HttpResponse
+from django.db import transaction
+
+
+api = NinjaAPI(csrf=True, renderer=ORJSONRenderer())
 
 # Категории и продукты
 
@@ -40,76 +58,133 @@ class ProductOut(Schema):
     category_id: int
     price: int
     description: str
+
+
+class SuggestOut(Schema):
+    id: int
+    title: str
    
     
+def load_category(slug):
+    return CategoryOut.from_orm(get_object_or_404(Category, slug=slug)).dict()
+
+
+def load_category_id(slug):
+    return get_object_or_404(Category, slug=slug).id
+
+
+def load_product(id):
+    return ProductOut.from_orm(get_object_or_404(Product, id=id)).dict()
+
+
 class BasicAuth(HttpBasicAuth):
     def authenticate(self, request, username, password):
+        user = credential_cache.get(username, password)
+        if user is not None:
+            return user
         user = authenticate(username=username, password=password)
+        if user is not None:
+            credential_cache.set(username, password, user)
         return user
 
 
-@api.post("category", auth=BasicAuth(), summary="Добавить категорию", tags=["Категория"])
+@api.post("category", auth=[TokenAuth(), BasicAuth()], summary="Добавить категорию", tags=["Категория"])
+@require_perm('category.add_category')
 def post_category(request, playload: CategoryIn):
-    if not request.auth.has_perm('category.add_category'):
-        raise HttpError(403, "Не достаточно прав")
     if Category.objects.filter(slug=playload.slug).exists():
         raise HttpError(400, "Категория с указанным slug уже существует")
     category = Category.objects.create(**playload.dict())
     return {"message": f"Категория успешно добавлена. Код категории: {category.id}"}
 
 @api.get("categories", response=List[CategoryOut], summary="Показать категории", tags=["Категория"])
-def get_categories(request):
+@conditional_get(catalog_version)
+def get_categories(request, response: HttpResponse, page: PageParams = Query(...),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
     categories = Category.objects.all()
-    return categories
+    return paginate_or_stream(categories, response, page, CategoryOut, cache_key=("categories",), fast=fast)
 
 @api.get("category/{slug}", response=CategoryOut, summary="Показать категорию", tags=["Категория"])
-def get_category(request, slug:str):
-    category = get_object_or_404(Category, slug=slug)
-    return category
+@conditional_get(catalog_version)
+def get_category(request, slug:str, response: HttpResponse):
+    return catalog_cache.get_or_set(("category", slug), lambda: load_category(slug))
 
-@api.delete("category/{slug}", auth=BasicAuth(), summary="Удалить категорию", tags=["Категория"])
+@api.delete("category/{slug}", auth=[TokenAuth(), BasicAuth()], summary="Удалить категорию", tags=["Категория"])
+@require_perm('category.delete_category')
 def delete_category(request, slug:str):
-    if not request.auth.has_perm('category.delete_category'):
-        raise HttpError(403, "Не достаточно прав")
     category = get_object_or_404(Category, slug=slug)
     category.delete()
     return {"message": "Категория успешно удалена"}
 
 @api.get("category/{slug}/products/", response=List[ProductOut], summary="Показать продукты категории", tags=["Категория"])
-def get_category_products(request, slug: str):
-    category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category)
-    return products
+@conditional_get(catalog_version)
+def get_category_products(request, slug: str, response: HttpResponse, page: PageParams = Query(...),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price"),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы, включается и полями fields")):
+    fields = parse_fields(ProductOut, fields)
+    category_id = catalog_cache.get_or_set(("category-id", slug), lambda: load_category_id(slug))
+    products = Product.objects.filter(category_id=category_id)
+    return paginate_or_stream(products, response, page, ProductOut, cache_key=("category-products", slug), fast=fast or bool(fields), fields=fields)
 
 @api.get("products", response=List[ProductOut], summary="Показать продукты", tags=["Продукт"])
-def get_products(request):
+@conditional_get(catalog_version)
+def get_products(request, response: HttpResponse, page: PageParams = Query(...),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price"),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы, включается и полями fields")):
+    fields = parse_fields(ProductOut, fields)
     products = Product.objects.all()
-    return products
-
-@api.post("product", auth=BasicAuth(), summary="Добавить продукт", tags=["Продукт"])
+    return paginate_or_stream(products, response, page, ProductOut, fast=fast or bool(fields), fields=fields)
+
+@api.get("products/suggest", response=List[SuggestOut], summary="Подсказки по началу названия продукта", tags=["Продукт"])
+def get_products_suggest(request, response: HttpResponse, q: str = Query(..., description = "Начало слова в названии"),
+                            limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT)):
+    return render_rows(response, suggest_index.suggest(q, limit))
+
+@api.get("products/batch", response=List[ProductOut], summary="Показать несколько продуктов", tags=["Продукт"])
+@conditional_get(catalog_version)
+def get_products_batch(request, response: HttpResponse, ids: List[int] = Query(..., description = "Коды продуктов"),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price")):
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_LIMIT:
+        raise HttpError(400, f"Не больше {MAX_LIMIT} продуктов за запрос")
+    plan = values_plan(ProductOut, parse_fields(ProductOut, fields))
+    return render_rows(response, plan.rows_by_id(Product.objects.all(), ids))
+
+@api.post("product", auth=[TokenAuth(), BasicAuth()], summary="Добавить продукт", tags=["Продукт"])
+@require_perm('product.add_product')
 def post_product(request, playload: ProductIn):
-    if not request.auth.has_perm('product.add_product'):
-        raise HttpError(403, "Не достаточно прав")
     product = Product.objects.create(**playload.dict())
     return {"message": f"Продукт успешно добавлен. Код продукта: {product.id}"}
 
+@api.post("products/import", auth=[TokenAuth(), BasicAuth()], summary="Импортировать продукты из NDJSON или CSV", tags=["Продукт"])
+@require_perm('product.add_product')
+def post_products_import(request, file: UploadedFile = File(...),
+                            format: str = Query(None, description = "ndjson или csv, по умолчанию по расширению файла")):
+    format = format or detect_format(file.name)
+    if format not in FORMATS:
+        raise HttpError(400, "Неизвестный формат файла")
+    result = import_products(file.file, format=format)
+    return {"message": f"Импортировано продуктов: {result.imported}", **result.dict()}
+
 @api.get("product/{id}", response=ProductOut, summary="Показать продукт", tags=["Продукт"])
-def get_product(request, id:int):
-    product = get_object_or_404(Product, id=id)
-    return product
+@conditional_get(catalog_version)
+def get_product(request, id:int, response: HttpResponse):
+    return catalog_cache.get_or_set(("product", id), lambda: load_product(id))
+
+@api.get("product/{id}/related", response=List[ProductOut], summary="Часто покупают вместе", tags=["Продукт"])
+def get_product_related(request, id:int, response: HttpResponse):
+    products = Product.objects.filter(related_to__product_id=id).order_by("related_to__rank")
+    return render_rows(response, values_plan(ProductOut).rows(products))
 
-@api.delete("product/{id}", auth=BasicAuth(), summary="Удалить продукт", tags=["Продукт"])
+@api.delete("product/{id}", auth=[TokenAuth(), BasicAuth()], summary="Удалить продукт", tags=["Продукт"])
+@require_perm('product.delete_product')
 def delete_product(request, id:int):
-    if not request.auth.has_perm('product.delete_product'):
-        raise HttpError(403, "Не достаточно прав")
     product = get_object_or_404(Product, id=id)
     product.delete()
     return {"message": "Продукт успешно удален"}
 
-@api.patch("product/{id}", auth=BasicAuth(), summary="Обновить продукт", tags=["Продукт"])
+@api.patch("product/{id}", auth=[TokenAuth(), BasicAuth()], summary="Обновить продукт", tags=["Продукт"])
+@require_perm('product.change_product')
 def patch_product(request, id: int, playload: ProductIn):
-    if not request.auth.has_perm('product.change_product'):
-        raise HttpError(403, "Не достаточно прав")
     product = get_object_or_404(Product, id=id)
     for attr, value in playload.dict().items():
         setattr(product, attr, value)
@@ -138,11 +213,41 @@ class UserOut(Schema):
     last_name: str
 
 
-@api.get("auth/check", summary="Проверка входа", auth=BasicAuth(), tags=["Пользователь"])
+class TokenRefresh(Schema):
+    refresh_token: str
+
+
+class TokenOut(Schema):
+    access_token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int
+
+
+@api.get("auth/check", summary="Проверка входа", auth=[TokenAuth(), BasicAuth()], tags=["Пользователь"])
 def get_auth_check(request):
     if request.auth:
         return {"message": f"Вход выполнен username - {request.auth.username}"}
 
+@api.post("auth/token", response=TokenOut, summary="Получить токен доступа", tags=["Пользователь"])
+def post_auth_token(request, playload: UserLogin):
+    user = authenticate(username=playload.username, password=playload.password)
+    if user is None:
+        raise HttpError(401, "Неверное имя пользователя или пароль")
+    return issue_tokens(user)
+
+@api.post("auth/token/refresh", response=TokenOut, summary="Обновить токен доступа", tags=["Пользователь"])
+def post_auth_token_refresh(request, playload: TokenRefresh):
+    tokens = refresh_tokens(playload.refresh_token)
+    if tokens is None:
+        raise HttpError(401, "Токен обновления недействителен")
+    return tokens
+
+@api.post("auth/token/revoke", auth=[TokenAuth(), BasicAuth()], summary="Отозвать все токены пользователя", tags=["Пользователь"])
+def post_auth_token_revoke(request):
+    revoke_user_tokens(request.auth.id)
+    return {"message": "Токены отозваны"}
+
 @api.post("auth/registration", summary="Регистрация", tags=["Пользователь"])
 def post_auth_registration(request, playload:UserRegistration):
     if User.objects.filter(username=playload.username).exists():
@@ -150,27 +255,42 @@ def post_auth_registration(request, playload:UserRegistration):
     User.objects.create(**playload.dict())
     return {"message": "Пользователь успешно зарегистрирован"}
 
-@api.get("users", summary="Показать пользователей", response=List[UserOut], auth=BasicAuth(), tags=["Пользователь"])
-def get_users(request):
-    if request.auth.has_perm('auth.view_user'):
-        return User.objects.all()
-    raise HttpError(403, "Не достаточно прав")
+@api.get("users", summary="Показать пользователей", response=List[UserOut], auth=[TokenAuth(), BasicAuth()], tags=["Пользователь"])
+@require_perm('auth.view_user')
+def get_users(request, response: HttpResponse, page: PageParams = Query(...),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
+    return paginate_or_stream(User.objects.all(), response, page, UserOut, fast=fast)
 
 @api.get("products/filter", response=List[ProductOut], summary="Отфильтровать продукты", tags=["Продукт"])
-def get_products_filter(request, title: str = Query(None, description = "Название продукта"),
+@conditional_get(products_filter_version)
+def get_products_filter(request, response: HttpResponse, title: str = Query(None, description = "Название продукта"),
                             description: str = Query(None, description = "Описание"),
                             min_price: int = Query(None, description = "Минимальная цена"),
-                            max_price: int = Query(None, description = "Максимальная цена")):
-    products = Product.objects.all()
-    if title is not None:
-        products = products.filter(title__iregex = title)
-    if description is not None:
-        products = products.filter(description__iregex = description)
+                            max_price: int = Query(None, description = "Максимальная цена"),
+                            category_id: int = Query(None, description = "Код категории"),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price"),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы, включается и полями fields")):
+    # fields= отдает не все поля схемы, поэтому работает только на быстром пути
+    fields = parse_fields(ProductOut, fields)
+    plan = values_plan(ProductOut, fields) if fast or fields else None
+    products = search_products(Product.objects.all(), title=title, description=description)
+    if PRICE_INDEX_ENABLED and title is None and description is None:
+        ids = price_index.lookup(min_price, max_price, category_id, limit=PRICE_INDEX_MAX_ROWS)
+        if ids is not None:
+            if plan is None:
+                found = products.in_bulk(ids)
+                return [found[id] for id in ids if id in found]
+            return render_rows(response, plan.rows_by_id(products, ids))
+        products = products.order_by("price", "id")
     if min_price is not None:
         products = products.filter(price__gte = min_price)
     if max_price is not None:
         products = products.filter(price__lte = max_price)
-    return products
+    if category_id is not None:
+        products = products.filter(category_id = category_id)
+    if plan is None:
+        return products
+    return render_rows(response, plan.rows(products))
 
 # Заказы и корзины
 
@@ -201,58 +321,211 @@ class OrderProductOut(Schema):
     price: int
 
 
-@api.get("wishlist", auth=BasicAuth(), response=List[WishListOut], summary="Показать корзину", tags=["Корзина"])
-def get_wishlist(request):
+class OrderStatusBulkIn(Schema):
+    status: str
+    ids: List[int] = None
+    current_status: str = None
+    date_from: datetime = None
+    date_to: datetime = None
+
+
+@api.get("wishlist", auth=[TokenAuth(), BasicAuth()], response=List[WishListOut], summary="Показать корзину", tags=["Корзина"])
+def get_wishlist(request, response: HttpResponse, fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
     wishlists = WishList.objects.filter(user=request.auth)
-    return wishlists
+    if not fast:
+        return wishlists.select_related("product")
+    return render_rows(response, values_plan(WishListOut).rows(wishlists))
 
-@api.post("wishlist/product", auth=BasicAuth(), summary="Добавить товар в корзину", tags=["Корзина"])
+@api.post("wishlist/product", auth=[TokenAuth(), BasicAuth()], summary="Добавить товар в корзину", tags=["Корзина"])
 def post_wishlist_product(request, playload: WishListIn):
-    user = request.auth
-    product = get_object_or_404(Product, id=playload.product_id)
-    if WishList.objects.filter(user=user, product=product):
-        wishlist = get_object_or_404(WishList, user=user, product=product)
-        wishlist.count = wishlist.count + playload.count
-        wishlist.save()
-    else:
-        count = playload.count
-        WishList.objects.create(user=user, product=product, count = count)
+    if not WishList.objects.add_products(request.auth, [(playload.product_id, playload.count)]):
+        raise HttpError(404, "Продукт не найден")
     return {"message": "Товар успешно добавлен в корзину"}
 
-@api.delete("wishlist", auth=BasicAuth(), summary="Очистить корзину", tags=["Корзина"])
+@api.post("wishlist/batch", auth=[TokenAuth(), BasicAuth()], summary="Изменить несколько товаров в корзине", tags=["Корзина"])
+def post_wishlist_batch(request, playload: List[WishListIn]):
+    counts = {}
+    for item in playload:
+        counts[item.product_id] = counts.get(item.product_id, 0) + item.count
+    with transaction.atomic():
+        found = set(Product.objects.filter(id__in=counts).values_list("id", flat=True))
+        missing = sorted(set(counts) - found)
+        if missing:
+            raise HttpError(404, f"Продукты не найдены: {', '.join(map(str, missing))}")
+        WishList.objects.add_products(request.auth, counts.items())
+        removed, _ = WishList.objects.filter(user=request.auth, count__lte=0).delete()
+    return {"message": "Корзина успешно обновлена", "updated": len(counts), "removed": removed}
+
+@api.delete("wishlist", auth=[TokenAuth(), BasicAuth()], summary="Очистить корзину", tags=["Корзина"])
 def delete_wishlist(request):
-    wishlist = WishList.objects.filter(user=request.auth)
-    for i in wishlist:
-        i.delete()
+    WishList.objects.filter(user=request.auth).delete()
     return {"message": "Корзина успешно очищена"}
 
-@api.get("orders", auth=BasicAuth(), response=List[OrderOut], summary="Показать заказы", tags=["Заказ"])
-def get_orders(request):
-    return Order.objects.filter(user=request.auth)
-
-@api.get("order/{id}", auth=BasicAuth(), response=List[OrderProductOut], summary="Показать детали заказа", tags=["Заказ"])
-def get_order(request, id:int):
+@api.get("orders", auth=[TokenAuth(), BasicAuth()], response=List[OrderOut], summary="Показать заказы", tags=["Заказ"])
+@conditional_get(orders_version)
+def get_orders(request, response: HttpResponse, fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
+    orders = Order.objects.filter(user=request.auth).order_by("-datetime")
+    if not fast:
+        return orders.select_related("user")
+    return render_rows(response, values_plan(OrderOut).rows(orders))
+
+@api.get("order/{id}", auth=[TokenAuth(), BasicAuth()], response=List[OrderProductOut], summary="Показать детали заказа", tags=["Заказ"])
+@conditional_get(orders_version)
+def get_order(request, id:int, response: HttpResponse, fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
     order = get_object_or_404(Order, id=id, user=request.auth)
-    return order.products.all()
-
-@api.post("order", auth=BasicAuth(), summary="Создать заказ", tags=["Заказ"])
+    if not fast:
+        return order.products.select_related("product")
+    return render_rows(response, values_plan(OrderProductOut).rows(order.products.all()))
+
+def create_order(user):
+    with transaction.atomic():
+        wishlist = list(WishList.objects.filter(user=user).select_related("product"))
+        if not wishlist:
+            raise HttpError('400', "Корзина пустая")
+        order = Order.objects.create(user=user, status="Новый")
+        lines = OrderProduct.objects.bulk_create(
+            OrderProduct(order=order, product=i.product, count=i.count, price=i.product.price) for i in wishlist
+        )
+        apply_new_order(order, lines)
+        record_order(order, lines)
+        WishList.objects.filter(id__in=[i.id for i in wishlist]).delete()
+        order.total = order.get_total_sum()
+        order.save(update_fields=["total"])
+    return order
+
+@api.post("order", auth=[TokenAuth(), BasicAuth()], summary="Создать заказ", tags=["Заказ"])
 def post_order(request):
-    if not WishList.objects.filter(user=request.auth).exists():
-        raise HttpError('400', "Корзина пустая")
-    wishlist = WishList.objects.filter(user=request.auth)
-    order = Order.objects.create(user=request.auth, status="Новый")
-    for i in wishlist:
-        OrderProduct.objects.create(order=order, product=i.product, count=i.count, price=i.product.price)
-        i.delete()
-    order.total = order.get_total_sum()
-    order.save()
+    create_order(request.auth)
     return {"message": "Заказ успешно создан"}
 
-@api.put("order/{id}/status/{status}", auth=BasicAuth(), summary="Изменить статус заказа", tags=["Заказ"])
+@api.put("order/{id}/status/{status}", auth=[TokenAuth(), BasicAuth()], summary="Изменить статус заказа", tags=["Заказ"])
+@require_perm('order.change_order')
 def put_order_status(request, id:int, status:str):
-    if not request.auth.has_perm('order.change_order'):
-        raise HttpError('403', "Не достаточно прав")
-    order = get_object_or_404(Order, id=id)
-    order.status = status
-    order.save()
+    with transaction.atomic():
+        order = get_object_or_404(Order, id=id)
+        apply_status_change(Order.objects.filter(id=order.id), status)
+        record_status_change(Order.objects.filter(id=order.id), status)
+        order.status = status
+        order.save()
     return {"message": "Статус успешно изменен"}
+
+@api.get("orders/export", auth=[TokenAuth(), BasicAuth()], summary="Выгрузить заказы в CSV или NDJSON", tags=["Заказ"])
+@require_perm('order.view_order')
+def get_orders_export(request, format: str = Query("csv", description = "csv или ndjson"),
+                            status: str = Query(None, description = "Статус заказа"),
+                            date_from: datetime = Query(None, description = "Дата создания от"),
+                            date_to: datetime = Query(None, description = "Дата создания до")):
+    if format not in EXPORT_FORMATS:
+        raise HttpError(400, "Неизвестный формат выгрузки")
+    return export_response(format, status=status, date_from=date_from, date_to=date_to)
+
+@api.put("orders/status", auth=[TokenAuth(), BasicAuth()], summary="Изменить статус нескольких заказов", tags=["Заказ"])
+@require_perm('order.change_order')
+def put_orders_status(request, playload: OrderStatusBulkIn):
+    filters = {
+        "id__in": playload.ids,
+        "status": playload.current_status,
+        "datetime__gte": playload.date_from,
+        "datetime__lte": playload.date_to,
+    }
+    filters = {key: value for key, value in filters.items() if value is not None}
+    if not filters:
+        raise HttpError(400, "Не указан ни один фильтр заказов")
+    with transaction.atomic():
+        orders = Order.objects.filter(**filters)
+        user_ids = set(orders.values_list("user_id", flat=True).distinct())
+        apply_status_change(orders, playload.status)
+        record_status_change(orders, playload.status)
+        updated = orders.update(status=playload.status)
+    for user_id in user_ids:
+        orders_generation(user_id).bump()
+    return {"message": "Статусы успешно изменены", "updated": updated}
+
+# Статистика
+
+
+class DailyRevenueOut(Schema):
+    date: date
+    revenue: int
+    orders: int
+    items: int
+
+
+class CategoryRevenueOut(Schema):
+    category_id: int
+    revenue: int
+    items: int
+
+
+class ProductRevenueOut(Schema):
+    product_id: int
+    revenue: int
+    items: int
+
+
+class CategoryStatsOut(Schema):
+    category_id: int
+    product_count: int
+    price_min: int = None
+    price_max: int = None
+    price_avg: float = None
+
+
+@api.get("stats/revenue/daily", response=List[DailyRevenueOut], auth=[TokenAuth(), BasicAuth()], summary="Выручка по дням", tags=["Статистика"])
+@require_perm('order.view_order')
+def get_stats_daily(request, date_from: date = Query(None, description = "Дата от"),
+                            date_to: date = Query(None, description = "Дата до")):
+    days = DailyRevenue.objects.order_by("date")
+    if date_from is not None:
+        days = days.filter(date__gte=date_from)
+    if date_to is not None:
+        days = days.filter(date__lte=date_to)
+    return days
+
+@api.get("stats/revenue/categories", response=List[CategoryRevenueOut], auth=[TokenAuth(), BasicAuth()], summary="Выручка по категориям", tags=["Статистика"])
+@require_perm('order.view_order')
+def get_stats_categories_revenue(request):
+    return CategoryRevenue.objects.order_by("-revenue", "category_id")
+
+@api.get("stats/revenue/products", response=List[ProductRevenueOut], auth=[TokenAuth(), BasicAuth()], summary="Самые продаваемые продукты", tags=["Статистика"])
+@require_perm('order.view_order')
+def get_stats_top_products(request, limit: int = Query(10, ge=1, le=1000)):
+    return ProductRevenue.objects.order_by("-revenue")[:limit]
+
+@api.get("stats/revenue/product/{id}", response=ProductRevenueOut, auth=[TokenAuth(), BasicAuth()], summary="Выручка продукта", tags=["Статистика"])
+@require_perm('order.view_order')
+def get_stats_product_revenue(request, id: int):
+    product = get_object_or_404(Product, id=id)
+    return ProductRevenue.objects.filter(product=product).first() or ProductRevenue(product=product)
+
+@api.get("stats/categories", response=List[CategoryStatsOut], summary="Статистика каталога по категориям", tags=["Статистика"])
+def get_stats_categories(request):
+    return CategoryStats.objects.order_by("category_id")
+
+# Мониторинг
+
+
+@api.get("metrics", summary="Метрики в формате Prometheus", auth=[TokenAuth(), BasicAuth()], tags=["Мониторинг"])
+def get_metrics(request):
+    if not request.auth.is_staff:
+        raise HttpError(403, "Не достаточно прав")
+    credentials = credential_cache.stats()
+    catalog = catalog_cache.stats()
+    permissions = permission_cache.stats()
+    prices = price_index.stats()
+    suggest = suggest_index.stats()
+    gauges = [
+        ("api_credential_cache_hits", "Попадания в кэш учетных данных", credentials["hits"]),
+        ("api_credential_cache_misses", "Промахи кэша учетных данных", credentials["misses"]),
+        ("api_permission_cache_hits", "Попадания в кэш прав", permissions["hits"]),
+        ("api_permission_cache_misses", "Промахи кэша прав", permissions["misses"]),
+        ("api_catalog_cache_local_hits", "Попадания в локальный кэш каталога", catalog["local_hits"]),
+        ("api_catalog_cache_shared_hits", "Попадания в общий кэш каталога", catalog["shared_hits"]),
+        ("api_catalog_cache_misses", "Промахи кэша каталога", catalog["misses"]),
+        ("api_price_index_products", "Продуктов в индексе цен", prices["products"]),
+        ("api_price_index_bytes", "Память массивов индекса цен", prices["bytes"]),
+        ("api_suggest_index_keys", "Ключей в индексе подсказок", suggest["keys"]),
+        ("api_suggest_index_bytes", "Память основы индекса подсказок", suggest["bytes"]),
+        ("api_suggest_index_pending", "Изменений вне основы индекса подсказок", suggest["pending"]),
+    ]
+    return HttpResponse(registry.render(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,125 @@
+from ninja import Router, Query
+from .models import Category, Product, WishList, Order
+from typing import List
+from django.shortcuts import aget_object_or_404
+from django.contrib.auth import aauthenticate
+from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from ninja.errors import HttpError
+from ninja.security.http import DecodeError
+from .api import (BasicAuth, CategoryOut, ProductOut, WishListIn, WishListOut, OrderOut, OrderProductOut, create_order,
+                  load_category, load_category_id, load_product)
+from .auth import credential_cache
+from .cache import catalog_cache
+from .conditional import conditional_get, catalog_version, orders_version
+from .tokens import TokenAuth
+from .pagination import PageParams, apaginate_or_stream
+from .renderers import parse_fields
+
+
+# Асинхронные варианты эндпоинтов чтения, корзины и заказов.
+# Подключаются к api с префиксом async/ и работают через асинхронный ORM Django.
+# Кэш каталога, ключи страниц и условные GET общие с синхронными эндпоинтами.
+
+router = Router()
+
+
+class AsyncTokenAuth(TokenAuth):
+    # Поколения токенов читаются из БД при промахе кэша, поэтому проверка уходит в поток
+    async def __call__(self, request):
+        return await sync_to_async(super().__call__)(request)
+
+
+class AsyncBasicAuth(BasicAuth):
+    async def __call__(self, request):
+        auth_value = request.headers.get(self.header)
+        if not auth_value:
+            return None
+        try:
+            username, password = self.decode_authorization(auth_value)
+        except DecodeError:
+            return None
+        return await self.authenticate(request, username, password)
+
+    async def authenticate(self, request, username, password):
+        user = await sync_to_async(credential_cache.get)(username, password)
+        if user is not None:
+            return user
+        user = await aauthenticate(username=username, password=password)
+        if user is not None:
+            await sync_to_async(credential_cache.set)(username, password, user)
+        return user
+
+
+# Категории и продукты
+
+
+@router.get("categories", response=List[CategoryOut], summary="Показать категории (async)", tags=["Категория"])
+@conditional_get(catalog_version)
+async def get_categories(request, response: HttpResponse, page: PageParams = Query(...),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы")):
+    categories = Category.objects.all()
+    return await apaginate_or_stream(categories, response, page, CategoryOut, cache_key=("categories",), fast=fast)
+
+@router.get("category/{slug}", response=CategoryOut, summary="Показать категорию (async)", tags=["Категория"])
+@conditional_get(catalog_version)
+async def get_category(request, slug: str, response: HttpResponse):
+    return await catalog_cache.aget_or_set(("category", slug), lambda: load_category(slug))
+
+@router.get("category/{slug}/products/", response=List[ProductOut], summary="Показать продукты категории (async)", tags=["Категория"])
+@conditional_get(catalog_version)
+async def get_category_products(request, slug: str, response: HttpResponse, page: PageParams = Query(...),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price"),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы, включается и полями fields")):
+    fields = parse_fields(ProductOut, fields)
+    category_id = await catalog_cache.aget_or_set(("category-id", slug), lambda: load_category_id(slug))
+    products = Product.objects.filter(category_id=category_id)
+    return await apaginate_or_stream(products, response, page, ProductOut, cache_key=("category-products", slug), fast=fast or bool(fields), fields=fields)
+
+@router.get("products", response=List[ProductOut], summary="Показать продукты (async)", tags=["Продукт"])
+@conditional_get(catalog_version)
+async def get_products(request, response: HttpResponse, page: PageParams = Query(...),
+                            fields: str = Query(None, description = "Поля через запятую, например id,title,price"),
+                            fast: bool = Query(False, description = "Быстрый путь без валидации схемы, включается и полями fields")):
+    fields = parse_fields(ProductOut, fields)
+    products = Product.objects.all()
+    return await apaginate_or_stream(products, response, page, ProductOut, fast=fast or bool(fields), fields=fields)
+
+@router.get("product/{id}", response=ProductOut, summary="Показать продукт (async)", tags=["Продукт"])
+@conditional_get(catalog_version)
+async def get_product(request, id: int, response: HttpResponse):
+    return await catalog_cache.aget_or_set(("product", id), lambda: load_product(id))
+
+# Заказы и корзины
+
+
+@router.get("wishlist", auth=[AsyncTokenAuth(), AsyncBasicAuth()], response=List[WishListOut], summary="Показать корзину (async)", tags=["Корзина"])
+async def get_wishlist(request):
+    return [i async for i in WishList.objects.filter(user=request.auth).select_related("product")]
+
+@router.post("wishlist/product", auth=[AsyncTokenAuth(), AsyncBasicAuth()], summary="Добавить товар в корзину (async)", tags=["Корзина"])
+async def post_wishlist_product(request, playload: WishListIn):
+    if not await sync_to_async(WishList.objects.add_products)(request.auth, [(playload.product_id, playload.count)]):
+        raise HttpError(404, "Продукт не найден")
+    return {"message": "Товар успешно добавлен в корзину"}
+
+@router.delete("wishlist", auth=[AsyncTokenAuth(), AsyncBasicAuth()], summary="Очистить корзину (async)", tags=["Корзина"])
+async def delete_wishlist(request):
+    await WishList.objects.filter(user=request.auth).adelete()
+    return {"message": "Корзина успешно очищена"}
+
+@router.get("orders", auth=[AsyncTokenAuth(), AsyncBasicAuth()], response=List[OrderOut], summary="Показать заказы (async)", tags=["Заказ"])
+@conditional_get(orders_version)
+async def get_orders(request, response: HttpResponse):
+    return [i async for i in Order.objects.filter(user=request.auth).select_related("user").order_by("-datetime")]
+
+@router.get("order/{id}", auth=[AsyncTokenAuth(), AsyncBasicAuth()], response=List[OrderProductOut], summary="Показать детали заказа (async)", tags=["Заказ"])
+@conditional_get(orders_version)
+async def get_order(request, id: int, response: HttpResponse):
+    order = await aget_object_or_404(Order, id=id, user=request.auth)
+    return [i async for i in order.products.select_related("product")]
+
+@router.post("order", auth=[AsyncTokenAuth(), AsyncBasicAuth()], summary="Создать заказ (async)", tags=["Заказ"])
+async def post_order(request):
+    await sync_to_async(create_order)(request.auth)
+    return {"message": "Заказ успешно создан"}
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OnlinestoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'onlineStore'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,64 @@
+import copy
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from .lru import TTLCache
+from .tokens import get_generations
+
+
+# Кэш проверенных учетных данных для BasicAuth.
+# Ключ - HMAC от username и пароля, сам пароль в памяти не хранится.
+# Кэш живет внутри процесса: свой процесс удаляет записи по сигналам, а изменения из других процессов
+# видны через поколение пользователя (tokens.get_generations), которое сигналы увеличивают
+# при смене пароля, активности и прав. Запись с устаревшим поколением не используется,
+# поэтому окно после изменения в другом процессе - API_TOKENS.GENERATION_TTL, а не TTL кэша.
+
+
+class CredentialCache:
+    def __init__(self, max_size=1024, ttl=300):
+        self._entries = TTLCache(max_size, ttl)
+
+    def make_key(self, username, password):
+        message = f"{username}\x00{password}".encode("utf-8")
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).digest()
+
+    def get(self, username, password):
+        key = self.make_key(username, password)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user, generations = entry
+        if generations != get_generations(user.pk):
+            self._entries.pop(key)
+            return None
+        return copy.copy(user)
+
+    def set(self, username, password, user):
+        # Поколение читается до повторной проверки хэша пароля в БД:
+        # изменение после проверки увеличит поколение, изменение до нее не даст закэшировать запись
+        generations = get_generations(user.pk)
+        if not User.objects.filter(pk=user.pk, password=user.password, is_active=True).exists():
+            return
+        self._entries.set(self.make_key(username, password), (copy.copy(user), generations))
+
+    def invalidate_user(self, user_id):
+        self._entries.discard_where(lambda key, entry: entry[0].pk == user_id)
+
+    def clear(self):
+        self._entries.clear()
+
+    def reset_stats(self):
+        self._entries.reset_stats()
+
+    def stats(self):
+        return self._entries.stats()
+
+
+_config = getattr(settings, "AUTH_CREDENTIAL_CACHE", {})
+
+credential_cache = CredentialCache(
+    max_size=_config.get("MAX_SIZE", 1024),
+    ttl=_config.get("TTL", 300),
+)
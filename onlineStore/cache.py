@@ -0,0 +1,167 @@
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from .lru import TTLCache
+from .models import CacheGeneration
+
+
+# Двухуровневый кэш каталога: LRU внутри процесса перед кэшем Django.
+# Ключи содержат поколение каталога, которое увеличивается сигналами Category/Product,
+# поэтому старые записи просто перестают читаться и вытесняются по TTL.
+# Поколения (каталога, заказов пользователя, самого пользователя) хранятся в БД (CacheGeneration),
+# общей для всех процессов: кэш Django по умолчанию - LocMem, у каждого процесса свой.
+# Процесс держит прочитанное поколение GENERATION_TTL секунд, поэтому изменение в другом процессе
+# видно не позже чем через GENERATION_TTL; свой процесс видит его сразу.
+# Одновременные промахи по одному ключу внутри процесса ждут первого вычисления.
+# aget_or_set для асинхронных обработчиков отдает попадание в локальный уровень без перехода в поток,
+# если и поколение уже прочитано.
+
+MISSING = object()
+
+_config = getattr(settings, "CATALOG_CACHE", {})
+
+generation_values = TTLCache(max_size=_config.get("GENERATION_CACHE_SIZE", 10_000), ttl=_config.get("GENERATION_TTL", 1))
+
+
+class Generation:
+    # Счетчик изменений. Значение - время последнего изменения в наносекундах,
+    # поэтому годится и как версия, и как Last-Modified.
+
+    def __init__(self, key):
+        self.key = key
+
+    def read(self):
+        rows = CacheGeneration.objects.filter(key=self.key).values_list("value", flat=True)
+        generation = rows.first()
+        if generation is None:
+            CacheGeneration.objects.bulk_create([CacheGeneration(key=self.key, value=time.time_ns())], ignore_conflicts=True)
+            generation = rows.first()
+        return generation
+
+    def get(self):
+        generation = generation_values.get(self.key)
+        if generation is None:
+            generation = self.read()
+            generation_values.set(self.key, generation)
+        return generation
+
+    async def aget(self):
+        generation = generation_values.get(self.key)
+        if generation is None:
+            generation = await sync_to_async(self.get)()
+        return generation
+
+    def bump(self):
+        generation = time.time_ns()
+        CacheGeneration.objects.bulk_create(
+            [CacheGeneration(key=self.key, value=generation)],
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=["value"],
+        )
+        generation_values.set(self.key, generation)
+
+
+class CatalogCache:
+    def __init__(self, alias="default", ttl=300, local_max_size=1024, local_ttl=30):
+        self.alias = alias
+        self.catalog_generation = Generation("catalog")
+        self.ttl = ttl
+        self.shared_hits = 0
+        self.misses = 0
+        self._local = TTLCache(local_max_size, local_ttl)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def generation(self):
+        return self.catalog_generation.get()
+
+    def bump(self):
+        self.catalog_generation.bump()
+
+    def make_key(self, parts, generation=None):
+        if generation is None:
+            generation = self.generation()
+        return "catalog:{}:{}".format(generation, ":".join(str(part) for part in parts))
+
+    def get_or_set(self, parts, producer):
+        key = self.make_key(parts)
+        while True:
+            with self._lock:
+                value = self._local.get(key, MISSING)
+                if value is not MISSING:
+                    return value
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            value = self.shared.get(key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+            else:
+                value = producer()
+                self.shared.set(key, value, self.ttl)
+                with self._lock:
+                    self.misses += 1
+            self._local.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    async def aget_or_set(self, parts, producer):
+        value = self._local.get(self.make_key(parts, await self.catalog_generation.aget()), MISSING)
+        if value is not MISSING:
+            return value
+        return await sync_to_async(self.get_or_set)(parts, producer)
+
+    def clear(self):
+        self._local.clear()
+        generation_values.clear()
+        self.bump()
+
+    def reset_stats(self):
+        self._local.reset_stats()
+        with self._lock:
+            self.shared_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        local = self._local.stats()
+        with self._lock:
+            hits = local["hits"] + self.shared_hits
+            total = hits + self.misses
+            return {
+                "local_size": local["size"],
+                "local_hits": local["hits"],
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+            }
+
+
+catalog_cache = CatalogCache(
+    alias=_config.get("ALIAS", "default"),
+    ttl=_config.get("TTL", 300),
+    local_max_size=_config.get("LOCAL_MAX_SIZE", 1024),
+    local_ttl=_config.get("LOCAL_TTL", 30),
+)
+
+
+def orders_generation(user_id):
+    return Generation(f"orders:user:{user_id}")
+
+
+def user_generation(user_id):
+    return Generation(f"user:{user_id}")
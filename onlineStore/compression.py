@@ -0,0 +1,95 @@
+import gzip
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+
+# Сжатие ответов API в gzip по Accept-Encoding.
+# Короткие ответы, 204/304 и HEAD не сжимаются, потоковые ответы (NDJSON, выгрузки)
+# сжимаются по мере генерации без накопления тела в памяти.
+
+_config = getattr(settings, "API_COMPRESSION", {})
+
+PATH_PREFIX = _config.get("PATH_PREFIX", "/api/")
+MIN_SIZE = _config.get("MIN_SIZE", 1024)
+LEVEL = _config.get("LEVEL", 6)
+
+SKIP_STATUSES = (204, 304)
+
+
+def accepts_gzip(header):
+    # Учитывает q-значения: "gzip;q=0" запрещает сжатие, "*" разрешает, если gzip не указан явно
+    accepted = None
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding == "gzip":
+            return quality > 0
+        accepted = quality > 0
+    return bool(accepted)
+
+
+def compress(content, level=LEVEL):
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, level=LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(chunks, level=LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if not request.path.startswith(PATH_PREFIX) or request.method == "HEAD":
+            return response
+        if response.status_code in SKIP_STATUSES or response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+        return response
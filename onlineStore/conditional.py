@@ -0,0 +1,76 @@
+import inspect
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from .cache import catalog_cache, orders_generation, user_generation
+from .price_index import ENABLED as PRICE_INDEX_ENABLED, price_index
+
+
+# Условные GET-запросы: ETag и Last-Modified строятся по счетчикам изменений,
+# поэтому ответ 304 отдается до выполнения запроса к БД и сериализации.
+# Версия - имя и одно или несколько поколений всего, что попадает в ответ:
+# ETag содержит их все, Last-Modified - время последнего изменения.
+# Поколения читаются из БД при промахе локального кэша (cache.Generation),
+# поэтому у асинхронных обработчиков проверка идет в потоке.
+
+
+def catalog_version(request):
+    return "catalog", catalog_cache.generation()
+
+
+def products_filter_version(request):
+    # Фильтр без поиска по тексту отвечает из индекса цен, который может отставать от поколения каталога:
+    # его версия в ETag не дает закрепить за новым поколением ответ из старого индекса.
+    # Только для синхронного маршрута: ensure() строит индекс из БД
+    name, *versions = catalog_version(request)
+    if PRICE_INDEX_ENABLED and "title" not in request.GET and "description" not in request.GET:
+        price_index.ensure()
+        versions.append(price_index.version())
+    return name, *versions
+
+
+def orders_version(request):
+    # В заказы вложены продукты и пользователь
+    user_id = request.auth.id
+    return f"orders-{user_id}", orders_generation(user_id).get(), catalog_cache.generation(), user_generation(user_id).get()
+
+
+def conditional_get(get_version):
+    def check(request):
+        name, *versions = get_version(request)
+        last_modified = max(versions) // 1_000_000_000
+        headers = {
+            "ETag": f'W/"{name}-{"-".join(map(str, versions))}"',
+            "Last-Modified": http_date(last_modified),
+        }
+        not_modified = get_conditional_response(request, etag=headers["ETag"], last_modified=last_modified)
+        return headers, not_modified if isinstance(not_modified, HttpResponseNotModified) else None
+
+    def finish(request, result, headers, kwargs):
+        response = result if isinstance(result, HttpResponseBase) else kwargs["response"]
+        for header, value in headers.items():
+            response[header] = value
+        if getattr(request, "auth", None) is not None:
+            patch_vary_headers(response, ["Authorization"])
+        return result
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                headers, result = await sync_to_async(check)(request)
+                if result is None:
+                    result = await view(request, *args, **kwargs)
+                return finish(request, result, headers, kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                headers, result = check(request)
+                if result is None:
+                    result = view(request, *args, **kwargs)
+                return finish(request, result, headers, kwargs)
+        return wrapper
+    return decorator
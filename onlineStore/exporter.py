@@ -0,0 +1,67 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from .models import OrderProduct
+from .pagination import STREAM_CHUNK_SIZE
+
+
+# Потоковая выгрузка заказов для бухгалтерии: одна строка на позицию заказа
+# вместе с заказом, пользователем и продуктом. Строки читаются через iterator(),
+# поэтому память не зависит от числа заказов.
+
+FORMATS = ("csv", "ndjson")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+COLUMNS = [
+    "order_id", "datetime", "status", "total", "user_id", "username",
+    "product_id", "product_title", "count", "price", "sum",
+]
+
+
+def export_rows(status=None, date_from=None, date_to=None):
+    lines = OrderProduct.objects.all()
+    if status is not None:
+        lines = lines.filter(order__status=status)
+    if date_from is not None:
+        lines = lines.filter(order__datetime__gte=date_from)
+    if date_to is not None:
+        lines = lines.filter(order__datetime__lte=date_to)
+    lines = lines.order_by("order_id", "id").values_list(
+        "order_id", "order__datetime", "order__status", "order__total", "order__user_id", "order__user__username",
+        "product_id", "product__title", "count", "price",
+    ).annotate(sum=F("count") * F("price"))
+    return lines.iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, "isoformat") else value for value in row])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(COLUMNS, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def iter_export(format, **filters):
+    rows = export_rows(**filters)
+    return iter_csv(rows) if format == "csv" else iter_ndjson(rows)
+
+
+def export_response(format, **filters):
+    response = StreamingHttpResponse(iter_export(format, **filters), content_type=CONTENT_TYPES[format])
+    response["Content-Disposition"] = f'attachment; filename="orders.{format}"'
+    return response
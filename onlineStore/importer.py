@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+from django.db import transaction
+from ninja import Field, Schema
+from pydantic import ValidationError
+from .cache import catalog_cache
+from .models import Category, Product
+from .stats import refresh_category_stats
+from .price_index import price_index
+from .suggest import suggest_index
+
+
+# Потоковый импорт каталога из NDJSON или CSV.
+# Строки читаются по одной и копятся в пачки: категории каждой пачки находятся одним запросом
+# (недостающие создаются), продукты пишутся одним bulk_create с upsert по id в своей транзакции.
+
+FORMATS = ("ndjson", "csv")
+
+MAX_REPORTED_ERRORS = 1000
+
+
+class ProductImportRow(Schema):
+    id: int = None
+    title: str = Field(..., max_length=50)
+    category: str = Field(..., max_length=50, description="Slug категории")
+    category_title: str = Field(None, max_length=50)
+    price: int
+    description: str = Field("", max_length=100)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.categories_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, error):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "categories_created": self.categories_created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def detect_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower() if filename else ""
+    return "csv" if extension == "csv" else "ndjson"
+
+
+def read_rows(stream, format):
+    # Возвращает пары (номер строки, dict или сообщение об ошибке разбора)
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Лишние значения DictReader складывает под ключ None
+            if None in row:
+                yield reader.line_num, f"Значений больше, чем столбцов в заголовке ({len(reader.fieldnames)})"
+                continue
+            yield reader.line_num, {key: value for key, value in row.items() if value not in (None, "")}
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"Некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Строка должна быть JSON-объектом"
+            continue
+        yield line_number, row
+
+
+def import_products(stream, format="ndjson", batch_size=1000, progress=None):
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    result = ImportResult()
+    batch = []
+    for line_number, row in read_rows(stream, format):
+        result.rows += 1
+        if isinstance(row, str):
+            result.add_error(line_number, row)
+            continue
+        try:
+            batch.append((line_number, ProductImportRow(**row)))
+        except ValidationError as e:
+            result.add_error(line_number, "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            ))
+            continue
+        if len(batch) >= batch_size:
+            write_batch(batch, result)
+            batch = []
+            if progress is not None:
+                progress(result)
+    if batch:
+        write_batch(batch, result)
+        if progress is not None:
+            progress(result)
+    catalog_cache.bump()
+    price_index.invalidate()
+    suggest_index.invalidate()
+    return result
+
+
+def write_batch(batch, result):
+    with transaction.atomic():
+        categories = resolve_categories([row for _, row in batch], result)
+        # Категории до upsert: продукт, перенесенный в другую категорию, меняет статистику обеих
+        old_categories = set(
+            Product.objects.filter(id__in=[row.id for _, row in batch if row.id is not None])
+            .values_list("category_id", flat=True).distinct()
+        )
+        products = [
+            Product(
+                id=row.id,
+                title=row.title,
+                category_id=categories[row.category],
+                price=row.price,
+                description=row.description,
+            )
+            for _, row in batch
+        ]
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["title", "category", "price", "description"],
+        )
+    refresh_category_stats(set(categories.values()) | old_categories)
+    result.imported += len(products)
+
+
+def resolve_categories(rows, result):
+    titles = {}
+    for row in rows:
+        titles.setdefault(row.category, row.category_title or row.category)
+    categories = dict(Category.objects.filter(slug__in=titles).values_list("slug", "id"))
+    missing = [Category(slug=slug, title=title) for slug, title in titles.items() if slug not in categories]
+    if missing:
+        Category.objects.bulk_create(missing, ignore_conflicts=True)
+        created = dict(Category.objects.filter(slug__in=[c.slug for c in missing]).values_list("slug", "id"))
+        result.categories_created += len(created)
+        categories.update(created)
+    return categories
@@ -0,0 +1,208 @@
+import json
+import time
+from base64 import b64encode
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from onlineStore.models import Category, Product, WishList, Order
+from onlineStore.pagination import encode_cursor
+from onlineStore.tokens import issue_tokens
+
+
+PASSWORD = "bench1234"
+IMPORT_ROWS = 100
+
+
+def basic_auth(username):
+    credentials = b64encode(f"{username}:{PASSWORD}".encode("utf-8")).decode("utf-8")
+    return {"HTTP_AUTHORIZATION": f"Basic {credentials}"}
+
+
+def bearer_auth(user):
+    # Токен выдается до замера: отзыв в auth/token/revoke делает недействительными прежние
+    return {"HTTP_AUTHORIZATION": f"Bearer {issue_tokens(user)['access_token']}"}
+
+
+def endpoints(data):
+    # name -> функция номера итерации, возвращающая (метод, путь, аргументы клиента)
+    user, admin = data["user"], data["admin"]
+    product_id, slug, order_id = data["product_id"], data["slug"], data["order_id"]
+    json_body = {"content_type": "application/json"}
+
+    def post_order(i):
+        # Корзина наполняется до замера, чтобы каждый заказ создавался из непустой корзины
+        WishList.objects.add_products(data["user_object"], [(pid, 1) for pid in data["product_ids"][:5]])
+        return "post", "/api/order", user
+
+    def post_products_import(i):
+        # Файл загрузки читается один раз, поэтому на каждый запрос новый
+        upload = SimpleUploadedFile("products.ndjson", data["import_file"], content_type="application/x-ndjson")
+        return "post", "/api/products/import", {"data": {"file": upload}, **admin}
+
+    return {
+        "get_categories": lambda i: ("get", "/api/categories", {}),
+        "get_category": lambda i: ("get", f"/api/category/{slug}", {}),
+        "get_category_products": lambda i: ("get", f"/api/category/{slug}/products/", {}),
+        "get_products": lambda i: ("get", "/api/products", {}),
+        "get_products_cursor": lambda i: ("get", f"/api/products?limit=100&cursor={data['cursor']}", {}),
+        "get_product": lambda i: ("get", f"/api/product/{data['product_ids'][i % len(data['product_ids'])]}", {}),
+        "get_products_batch": lambda i: ("get", "/api/products/batch?" + "&".join(
+            f"ids={pid}" for pid in data["product_ids"][:20]), {}),
+        "get_products_fields": lambda i: ("get", "/api/products?fields=title,price", {}),
+        "get_products_filter_title": lambda i: ("get", "/api/products/filter?title=стол", {}),
+        "get_products_filter_price": lambda i: ("get", "/api/products/filter?min_price=1000&max_price=2000", {}),
+        "get_products_suggest": lambda i: ("get", f"/api/products/suggest?q={data['suggest_prefix']}", {}),
+        "get_product_related": lambda i: ("get", f"/api/product/{data['product_ids'][i % len(data['product_ids'])]}/related", {}),
+        "post_products_import": post_products_import,
+        "get_users": lambda i: ("get", "/api/users", admin),
+        "get_auth_check": lambda i: ("get", "/api/auth/check", user),
+        "get_auth_check_bearer": lambda i: ("get", "/api/auth/check", bearer_auth(data["user_object"])),
+        "post_auth_token": lambda i: ("post", "/api/auth/token", {
+            "data": {"username": data["user_object"].username, "password": PASSWORD}, **json_body}),
+        "post_auth_token_refresh": lambda i: ("post", "/api/auth/token/refresh", {
+            "data": {"refresh_token": issue_tokens(data["user_object"])["refresh_token"]}, **json_body}),
+        "post_auth_token_revoke": lambda i: ("post", "/api/auth/token/revoke", bearer_auth(data["user_object"])),
+        "post_auth_registration": lambda i: ("post", "/api/auth/registration", {
+            "data": {"username": f"bench-registered-{i}", "password": PASSWORD, "first_name": "", "last_name": ""},
+            **json_body}),
+        "get_wishlist": lambda i: ("get", "/api/wishlist", user),
+        "post_wishlist_product": lambda i: ("post", "/api/wishlist/product", {
+            "data": {"product_id": product_id, "count": 1}, **json_body, **user}),
+        "post_wishlist_batch": lambda i: ("post", "/api/wishlist/batch", {
+            "data": [{"product_id": pid, "count": 1} for pid in data["product_ids"][:20]], **json_body, **user}),
+        "post_order": post_order,
+        "delete_wishlist": lambda i: ("delete", "/api/wishlist", user),
+        "get_orders": lambda i: ("get", "/api/orders", user),
+        "get_order": lambda i: ("get", f"/api/order/{order_id}", user),
+        "put_order_status": lambda i: ("put", f"/api/order/{order_id}/status/Отправлен", admin),
+        "put_orders_status": lambda i: ("put", "/api/orders/status", {
+            "data": {"status": "В обработке", "current_status": "Новый"}, **json_body, **admin}),
+        "get_orders_export_csv": lambda i: ("get", "/api/orders/export", admin),
+        "get_orders_export_ndjson": lambda i: ("get", "/api/orders/export?format=ndjson", admin),
+        "get_stats_daily": lambda i: ("get", "/api/stats/revenue/daily", admin),
+        "get_stats_categories_revenue": lambda i: ("get", "/api/stats/revenue/categories", admin),
+        "get_stats_top_products": lambda i: ("get", "/api/stats/revenue/products", admin),
+        "get_stats_product_revenue": lambda i: ("get", f"/api/stats/revenue/product/{product_id}", admin),
+        "get_stats_categories": lambda i: ("get", "/api/stats/categories", {}),
+        "post_category": lambda i: ("post", "/api/category", {
+            "data": {"title": "Бенчмарк", "slug": f"bench-new-{i}"}, **json_body, **admin}),
+        "post_product": lambda i: ("post", "/api/product", {
+            "data": {"title": "Бенчмарк", "category_id": data["category_id"], "price": 100, "description": ""},
+            **json_body, **admin}),
+        "patch_product": lambda i: ("patch", f"/api/product/{product_id}", {
+            "data": {"title": f"Бенчмарк {i}", "category_id": data["category_id"], "price": 100, "description": ""},
+            **json_body, **admin}),
+        "delete_product": lambda i: ("delete", f"/api/product/{data['deletable_ids'][i]}", admin),
+        "delete_category": lambda i: ("delete", f"/api/category/bench-new-{i}", admin),
+        "get_metrics": lambda i: ("get", "/api/metrics", admin),
+    }
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = "Прогон всех эндпоинтов api.py тестовым клиентом на синтетических данных; результат в JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", type=int, nargs="+", default=[1000], help="Число продуктов")
+        parser.add_argument("--requests", type=int, default=50, help="Запросов на эндпоинт")
+        parser.add_argument("--endpoints", nargs="*", help="Только перечисленные эндпоинты")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Файл для JSON с результатами")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            results = [self.run_scale(scale, options) for scale in options["scales"]]
+        finally:
+            teardown_test_environment()
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(report)
+        self.stdout.write(report)
+
+    def run_scale(self, scale, options):
+        # Отдельная тестовая БД на каждый масштаб, рабочая db.sqlite3 не меняется
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            start = time.perf_counter()
+            call_command("generate_data", products=scale, seed=options["seed"], password=PASSWORD, stdout=StringIO())
+            generation = time.perf_counter() - start
+            data = self.prepare(options["requests"])
+            client = Client()
+            stats = {}
+            for name, make_request in endpoints(data).items():
+                if options["endpoints"] and name not in options["endpoints"]:
+                    continue
+                stats[name] = self.measure(client, make_request, options["requests"])
+                self.stderr.write(f"{scale}: {name} p50 {stats[name]['p50_ms']:.2f} мс")
+            return {"products": scale, "generation_seconds": generation, "endpoints": stats}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def prepare(self, requests):
+        user = User.objects.filter(username__startswith="bench-user-").order_by("id").first()
+        User.objects.create_superuser(username="bench-admin", password=PASSWORD)
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True)[:100])
+        category = Category.objects.order_by("id").first()
+        import_file = "".join(
+            json.dumps({"title": f"Импорт {i}", "category": category.slug, "price": 100 + i}, ensure_ascii=False) + "\n"
+            for i in range(IMPORT_ROWS)
+        ).encode("utf-8")
+        deletable = Product.objects.bulk_create(
+            Product(title="Удаляемый", category=category, price=1, description="") for _ in range(requests + 1)
+        )
+        return {
+            "user_object": user,
+            "user": basic_auth(user.username),
+            "admin": basic_auth("bench-admin"),
+            "product_id": product_ids[0],
+            "product_ids": product_ids,
+            "deletable_ids": [product.id for product in deletable],
+            "category_id": category.id,
+            "slug": category.slug,
+            "order_id": Order.objects.filter(user=user).order_by("id").first().id,
+            "cursor": encode_cursor(product_ids[-1]),
+            "suggest_prefix": Product.objects.get(id=product_ids[0]).title.split()[0][:3].lower(),
+            "import_file": import_file,
+        }
+
+    def measure(self, client, make_request, count):
+        latencies = []
+        queries = []
+        errors = 0
+        method, path, kwargs = make_request(count)
+        getattr(client, method)(path, **kwargs)
+        for i in range(count):
+            method, path, kwargs = make_request(i)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                # Потоковый ответ (выгрузка заказов) формируется при чтении тела
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            if response.status_code >= 400:
+                errors += 1
+        latencies.sort()
+        total = sum(latencies)
+        return {
+            "requests": count,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "rps": count / total if total else 0.0,
+            "queries_mean": sum(queries) / len(queries),
+            "queries_max": max(queries),
+            "errors": errors,
+        }
@@ -0,0 +1,92 @@
+import asyncio
+import importlib
+import json
+import time
+from django.core.management.base import BaseCommand
+
+
+PATHS = [
+    ("/api/products", "/api/async/products"),
+    ("/api/categories", "/api/async/categories"),
+]
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест синхронных и асинхронных эндпоинтов через приложение ninja-api/asgi.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        application = importlib.import_module("ninja-api.asgi").application
+        results = []
+        for sync_path, async_path in PATHS:
+            for path in (sync_path, async_path):
+                stats = asyncio.run(self.run_load(application, path, options["requests"], options["concurrency"]))
+                results.append(stats)
+                self.stdout.write(f"{path:28} {stats['rps']:8.1f} запр/с  p50 {stats['p50_ms']:7.2f} мс  "
+                                  f"p95 {stats['p95_ms']:7.2f} мс  ошибок {stats['errors']}")
+        self.stdout.write(json.dumps(results, ensure_ascii=False))
+
+    async def run_load(self, application, path, count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                status = await self.request(application, path)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+
+        await self.request(application, path)
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(count)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "path": path,
+            "requests": count,
+            "concurrency": concurrency,
+            "rps": count / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "errors": errors,
+        }
+
+    async def request(self, application, path):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("ascii"),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        status = None
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await application(scope, receive, send)
+        return status
@@ -0,0 +1,56 @@
+import time
+from base64 import b64encode
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import RequestFactory
+from onlineStore.api import BasicAuth
+from onlineStore.auth import credential_cache
+from onlineStore.tokens import TokenAuth, issue_tokens
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Замер стоимости BasicAuth на запрос без кэша и с кэшем учетных данных и проверки токена доступа"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username="bench-auth", password="bench1234")
+                credentials = b64encode(b"bench-auth:bench1234").decode("utf-8")
+                request = RequestFactory().get("/api/auth/check", HTTP_AUTHORIZATION=f"Basic {credentials}")
+                auth = BasicAuth()
+
+                cold = self.measure(auth, request, count, clear=True)
+                credential_cache.clear()
+                auth(request)
+                credential_cache.reset_stats()
+                warm = self.measure(auth, request, count, clear=False)
+                token = issue_tokens(user)["access_token"]
+                request = RequestFactory().get("/api/auth/check", HTTP_AUTHORIZATION=f"Bearer {token}")
+                bearer = self.measure(TokenAuth(), request, count, clear=False)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"без кэша: {cold * 1000:.3f} мс/запрос")
+        self.stdout.write(f"с кэшем:  {warm * 1000:.3f} мс/запрос")
+        self.stdout.write(f"токен:    {bearer * 1000:.3f} мс/запрос")
+        self.stdout.write(f"ускорение: x{cold / warm:.0f} с кэшем, x{cold / bearer:.0f} с токеном")
+        self.stdout.write(f"статистика кэша: {credential_cache.stats()}")
+
+    def measure(self, auth, request, count, clear):
+        start = time.perf_counter()
+        for _ in range(count):
+            if clear:
+                credential_cache.clear()
+            if auth(request) is None:
+                raise RuntimeError("Аутентификация не прошла")
+        return (time.perf_counter() - start) / count
@@ -0,0 +1,53 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from onlineStore.compression import compress, compress_stream
+from onlineStore.renderers import dumps
+
+
+WORDS = ["стол", "стул", "шкаф", "диван", "кресло", "лампа", "полка", "кровать", "комод", "зеркало",
+         "дубовый", "белый", "черный", "складной", "угловой", "детский", "офисный", "мягкий", "новый", "большой"]
+
+
+class Command(BaseCommand):
+    help = "Экономия трафика и стоимость CPU на ответ при сжатии gzip для списков и потоков NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000, 10_000])
+        parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for count in options["rows"]:
+            products = [
+                {"id": i, "title": " ".join(rnd.sample(WORDS, 3)), "category_id": rnd.randint(1, 100),
+                 "price": rnd.randint(1, 100_000), "description": " ".join(rnd.sample(WORDS, 5))}
+                for i in range(1, count + 1)
+            ]
+            orders = [
+                {"id": i, "user": {"id": 1, "username": "bench-user", "first_name": "", "last_name": ""},
+                 "datetime": start + timedelta(minutes=i), "status": "Новый", "total": rnd.randint(1, 100_000)}
+                for i in range(1, count + 1)
+            ]
+            lines = [dumps(product) + b"\n" for product in products]
+            payloads = [
+                ("products", lambda level: compress(body, level), dumps(products)),
+                ("orders", lambda level: compress(body, level), dumps(orders)),
+                ("products.ndjson", lambda level: b"".join(compress_stream(lines, level)), b"".join(lines)),
+            ]
+            for name, run, body in payloads:
+                for level in options["levels"]:
+                    size, cpu = self.measure(run, level, options["repeat"])
+                    self.stdout.write(
+                        f"{name:16} строк {count:6}  уровень {level}  {len(body):9} -> {size:8} байт"
+                        f"  экономия {100 - size * 100 / len(body):5.1f}%  CPU {cpu * 1000:8.3f} мс/ответ"
+                    )
+
+    def measure(self, run, level, repeat):
+        start = time.process_time()
+        for _ in range(repeat):
+            size = len(run(level))
+        return size, (time.process_time() - start) / repeat
@@ -0,0 +1,89 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from onlineStore.api import ProductOut
+from onlineStore.models import Category, Product
+from onlineStore.price_index import PriceIndex
+from onlineStore.renderers import values_plan
+
+
+# (мин. цена, макс. цена, с категорией): цены равномерны в 1..100000, категорий 100
+WINDOWS = [
+    (50_000, 50_100, False),
+    (50_000, 51_000, False),
+    (10_000, 20_000, True),
+    (50_000, 60_000, False),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Сравнение индекса цен в памяти и запроса ORM для фильтра по цене и категории"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, nargs="+", default=[1_000_000])
+        parser.add_argument("--categories", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        plan = values_plan(ProductOut)
+        for count in options["products"]:
+            try:
+                with transaction.atomic():
+                    categories = self.fill(count, options["categories"], options["batch_size"])
+                    index = PriceIndex(max_age=float("inf"))
+                    start = time.perf_counter()
+                    index.ensure()
+                    build = time.perf_counter() - start
+                    stats = index.stats()
+                    self.stdout.write(f"Продуктов: {count}, построение индекса {build:.2f} с, "
+                                      f"память {stats['bytes'] / 2 ** 20:.1f} МБ")
+                    for min_price, max_price, scoped in WINDOWS:
+                        category_id = categories[0] if scoped else None
+                        products = Product.objects.filter(price__gte=min_price, price__lte=max_price)
+                        if scoped:
+                            products = products.filter(category_id=category_id)
+                        products = products.order_by("price", "id")
+                        orm_ids = self.measure(lambda: list(products.values_list("id", flat=True)), options["repeat"])
+                        index_ids = self.measure(lambda: index.lookup(min_price, max_price, category_id), options["repeat"])
+                        orm_rows = self.measure(lambda: plan.rows(products), options["repeat"])
+                        index_rows = self.measure(
+                            lambda: plan.rows_by_id(Product.objects.all(), index.lookup(min_price, max_price, category_id)),
+                            options["repeat"],
+                        )
+                        window = f"{min_price}..{max_price}" + (" в категории" if scoped else "")
+                        self.stdout.write(
+                            f"  {window:26} найдено {orm_ids[1]:7}  id: ORM {orm_ids[0] * 1000:8.2f} мс, "
+                            f"индекс {index_ids[0] * 1000:7.3f} мс  строки: ORM {orm_rows[0] * 1000:8.2f} мс, "
+                            f"индекс {index_rows[0] * 1000:8.2f} мс"
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def fill(self, count, categories_count, batch_size):
+        rnd = random.Random(count)
+        categories = Category.objects.bulk_create(
+            Category(title=f"Бенчмарк {i}", slug=f"bench-price-{i}") for i in range(categories_count)
+        )
+        category_ids = [category.id for category in categories]
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                Product(title="Бенчмарк", description="", category_id=rnd.choice(category_ids), price=rnd.randint(1, 100_000))
+                for _ in range(start, min(start + batch_size, count))
+            )
+        return category_ids
+
+    def measure(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = len(run())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, found
@@ -0,0 +1,63 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from onlineStore.models import Category, Product
+from onlineStore.search import search_products
+
+
+WORDS = ["стол", "стул", "шкаф", "диван", "кресло", "лампа", "полка", "кровать", "комод", "зеркало",
+         "дубовый", "белый", "черный", "складной", "угловой", "детский", "офисный", "мягкий", "новый", "большой"]
+
+QUERIES = ["стол", "дуб", "кресло мягк", "угл", "зеркало"]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Сравнение поиска FTS5 и фильтра iregex на синтетическом каталоге"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, nargs="+", default=[100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        for count in options["products"]:
+            try:
+                with transaction.atomic():
+                    self.fill(count, options["batch_size"])
+                    self.stdout.write(f"Продуктов: {count}")
+                    for query in QUERIES:
+                        regex = self.measure(lambda: Product.objects.filter(title__iregex=query), options["repeat"])
+                        fts = self.measure(lambda: search_products(Product.objects.all(), title=query), options["repeat"])
+                        self.stdout.write(f"  {query!r:18} iregex {regex[0] * 1000:9.1f} мс ({regex[1]})"
+                                          f"  fts5 {fts[0] * 1000:8.1f} мс ({fts[1]})")
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def fill(self, count, batch_size):
+        rnd = random.Random(count)
+        category = Category.objects.create(title="Бенчмарк", slug="bench-search")
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                Product(
+                    title=" ".join(rnd.sample(WORDS, 3)),
+                    description=" ".join(rnd.sample(WORDS, 5)),
+                    category=category,
+                    price=rnd.randint(1, 100_000),
+                )
+                for _ in range(start, min(start + batch_size, count))
+            )
+
+    def measure(self, make_queryset, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = len(list(make_queryset().values_list("id", flat=True)))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, found
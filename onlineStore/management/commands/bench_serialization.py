@@ -0,0 +1,67 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from ninja.renderers import JSONRenderer
+from onlineStore.api import ProductOut, OrderOut
+from onlineStore.models import Product, Order
+from onlineStore.renderers import ORJSONRenderer, values_plan
+
+
+WORDS = ["стол", "стул", "шкаф", "диван", "кресло", "лампа", "полка", "кровать", "комод", "зеркало"]
+
+
+class Command(BaseCommand):
+    help = "Пропускная способность сериализации списков: схема + json, схема + orjson, values + orjson"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        count = options["rows"]
+        products = [
+            Product(id=i, title=" ".join(rnd.sample(WORDS, 3)), category_id=rnd.randint(1, 100),
+                    price=rnd.randint(1, 100_000), description=" ".join(rnd.sample(WORDS, 5)))
+            for i in range(1, count + 1)
+        ]
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        user = User(id=1, username="bench-user", first_name="Иван", last_name="Иванов")
+        orders = [
+            Order(id=i, user=user, datetime=start + timedelta(minutes=i), status="Новый", total=rnd.randint(1, 100_000))
+            for i in range(1, count + 1)
+        ]
+        cases = [
+            ("ProductOut", ProductOut, products, [
+                (p.id, p.title, p.category_id, p.price, p.description) for p in products
+            ]),
+            ("OrderOut", OrderOut, orders, [
+                (o.id, user.id, user.username, user.first_name, user.last_name, o.datetime, o.status, o.total)
+                for o in orders
+            ]),
+        ]
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        for name, schema, objects, tuples in cases:
+            plan = values_plan(schema)
+            variants = [
+                ("схема + json", lambda: stdlib.render(None, [schema.from_orm(o).dict() for o in objects], response_status=200)),
+                ("схема + orjson", lambda: fast.render(None, [schema.from_orm(o).dict() for o in objects], response_status=200)),
+                ("values + orjson", lambda: fast.render(None, [plan.to_dict(row) for row in tuples], response_status=200)),
+            ]
+            self.stdout.write(f"{name}, строк: {count}")
+            base = None
+            for label, render in variants:
+                seconds = self.measure(render, options["repeat"])
+                base = base or seconds
+                self.stdout.write(f"  {label:16} {count / seconds:12,.0f} строк/с  {seconds * 1000:8.1f} мс  x{base / seconds:.1f}")
+
+    def measure(self, render, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
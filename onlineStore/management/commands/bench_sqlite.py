@@ -0,0 +1,87 @@
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Конкурентная запись и чтение на копии db.sqlite3: настройки по умолчанию против SQLITE_PRAGMAS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+
+    def handle(self, *args, **options):
+        source = Path(settings.DATABASES["default"]["NAME"])
+        profiles = {
+            "по умолчанию": ({}, "DEFERRED"),
+            "SQLITE_PRAGMAS": (settings.SQLITE_PRAGMAS, "IMMEDIATE"),
+        }
+        for name, (pragmas, mode) in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / source.name
+                shutil.copy(source, path)
+                stats = self.run(path, pragmas, mode, options)
+            self.stdout.write(
+                f"{name:15} записей {stats['writes'] / options['seconds']:8.1f}/с  "
+                f"чтений {stats['reads'] / options['seconds']:9.1f}/с  "
+                f"ошибок блокировки {stats['errors']}"
+            )
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def run(self, path, pragmas, mode, options):
+        setup = self.connect(path, pragmas)
+        setup.execute("CREATE TABLE bench_contention (id INTEGER PRIMARY KEY, user_id INTEGER, count INTEGER)")
+        setup.close()
+
+        stats = {"writes": 0, "reads": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+
+        def writer(number):
+            connection = self.connect(path, pragmas)
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute(f"BEGIN {mode}")
+                    connection.execute("SELECT count(*) FROM bench_contention WHERE user_id = ?", (number,)).fetchone()
+                    connection.execute("INSERT INTO bench_contention (user_id, count) VALUES (?, 1)", (number,))
+                    connection.execute("COMMIT")
+                    key = "writes"
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    key = "errors"
+                with lock:
+                    stats[key] += 1
+            connection.close()
+
+        def reader():
+            connection = self.connect(path, pragmas)
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute('SELECT count(*), max(price) FROM "onlineStore_product"').fetchone()
+                    connection.execute("SELECT count(*) FROM bench_contention").fetchone()
+                    key = "reads"
+                except sqlite3.OperationalError:
+                    key = "errors"
+                with lock:
+                    stats[key] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options["writers"])]
+        threads += [threading.Thread(target=reader) for _ in range(options["readers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
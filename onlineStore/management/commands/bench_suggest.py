@@ -0,0 +1,51 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from onlineStore.suggest import SuggestIndex, fold
+
+
+WORDS = [
+    "смартфон", "ноутбук", "чайник", "ёлка", "кофеварка", "наушники", "телевизор", "пылесос", "утюг", "фен",
+    "Samsung", "Xiaomi", "Apple", "Bosch", "Philips", "беспроводные", "черный", "белый", "игровой", "компактный",
+    "электрический", "стальной", "детский", "складной", "умный", "Pro", "Max", "Lite", "мини", "плюс",
+]
+
+
+class Command(BaseCommand):
+    help = "Замер подсказок по названию на синтетических названиях без БД: построение, память и задержки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--titles", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=20_000)
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--updates", type=int, default=200)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["titles"])
+        rows = [
+            (id, " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 4))) + f" {id}", int(rnd.paretovariate(1.2)))
+            for id in range(1, options["titles"] + 1)
+        ]
+        index = SuggestIndex(max_age=float("inf"), max_pending=float("inf"))
+        start = time.perf_counter()
+        index.rebuild(rows)
+        build = time.perf_counter() - start
+        stats = index.stats()
+        self.stdout.write(f"Названий: {len(rows)}, ключей {stats['keys']}, построение {build:.2f} с, "
+                          f"память основы {stats['bytes'] / 2 ** 20:.1f} МБ")
+
+        for id, title, score in rnd.sample(rows, options["updates"]):
+            index.update(id, title.upper(), score + 1000)
+        queries = []
+        for _ in range(options["queries"]):
+            word = fold(rnd.choice(WORDS))
+            queries.append(word[:rnd.randint(1, len(word))])
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.suggest(query, options["limit"])
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50, p95, p99 = (timings[int(len(timings) * q) - 1] * 1000 for q in (0.5, 0.95, 0.99))
+        self.stdout.write(f"Запросов: {len(queries)}, изменений в дельте {options['updates']}: "
+                          f"p50 {p50:.3f} мс, p95 {p95:.3f} мс, p99 {p99:.3f} мс")
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from onlineStore.models import Category, Product, WishList, Order, OrderProduct
+from onlineStore.pagination import keyset_queryset
+from onlineStore.search import search_products
+
+
+# Основные запросы эндпоинтов api.py. Полный проход по таблице допустим
+# только для постраничных списков без фильтра: они ограничены LIMIT.
+
+def endpoint_queries():
+    return [
+        ("get_categories", keyset_queryset(Category.objects.all(), None)[:101], True),
+        ("get_category", Category.objects.filter(slug="slug"), False),
+        ("get_category_products", keyset_queryset(Product.objects.filter(category_id=1), None)[:101], False),
+        ("get_products", keyset_queryset(Product.objects.all(), None)[:101], True),
+        ("get_product", Product.objects.filter(id=1), False),
+        ("get_products_filter (title)", search_products(Product.objects.all(), title="стол"), False),
+        ("get_products_filter (price)", Product.objects.filter(price__gte=100, price__lte=1000), False),
+        ("get_products_filter (category, price)", Product.objects.filter(category_id=1, price__gte=100, price__lte=1000), False),
+        ("get_users", keyset_queryset(User.objects.all(), None)[:101], True),
+        ("get_wishlist", WishList.objects.filter(user_id=1).select_related("product"), False),
+        ("post_wishlist_product", WishList.objects.filter(user_id=1, product_id=1), False),
+        ("get_orders", Order.objects.filter(user_id=1).select_related("user").order_by("-datetime"), False),
+        ("get_order", OrderProduct.objects.filter(order_id=1).select_related("product"), False),
+        ("post_order", WishList.objects.filter(user_id=1).select_related("product"), False),
+    ]
+
+
+def is_full_scan(line):
+    return " SCAN " in f" {line} " and "VIRTUAL TABLE" not in line
+
+
+class Command(BaseCommand):
+    help = "Показать EXPLAIN QUERY PLAN для основного запроса каждого эндпоинта"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fail-on-scan", action="store_true", help="Завершиться с ошибкой при полном проходе по таблице")
+
+    def handle(self, *args, **options):
+        scans = []
+        for name, queryset, allow_scan in endpoint_queries():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for line in plan.splitlines():
+                self.stdout.write(f"  {line}")
+                if is_full_scan(line) and not allow_scan:
+                    scans.append(f"{name}: {line.strip()}")
+        if scans:
+            message = "Полный проход по таблице:\n" + "\n".join(scans)
+            if options["fail_on_scan"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+from onlineStore.exporter import FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка заказов с позициями в CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--status")
+        parser.add_argument("--date-from", type=parse_datetime)
+        parser.add_argument("--date-to", type=parse_datetime)
+        parser.add_argument("--output", help="Файл для выгрузки, по умолчанию stdout")
+
+    def handle(self, *args, **options):
+        chunks = iter_export(
+            options["format"], status=options["status"], date_from=options["date_from"], date_to=options["date_to"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as file:
+                file.writelines(chunks)
+        else:
+            self.stdout.ending = ""
+            for chunk in chunks:
+                self.stdout.write(chunk)
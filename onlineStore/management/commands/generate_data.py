@@ -0,0 +1,106 @@
+import random
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from onlineStore.cache import catalog_cache
+from onlineStore.price_index import price_index
+from onlineStore.suggest import suggest_index
+from onlineStore.models import Category, Product, WishList, Order, OrderProduct
+from onlineStore.stats import rebuild_stats
+from onlineStore.related import rebuild_related
+
+
+WORDS = ["стол", "стул", "шкаф", "диван", "кресло", "лампа", "полка", "кровать", "комод", "зеркало",
+         "дубовый", "белый", "черный", "складной", "угловой", "детский", "офисный", "мягкий", "новый", "большой"]
+
+STATUSES = ["Новый", "В обработке", "Отправлен", "Доставлен"]
+
+
+class Command(BaseCommand):
+    help = "Сгенерировать детерминированные тестовые данные: категории, продукты, пользователей, корзины и заказы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--categories", type=int, help="По умолчанию products / 100")
+        parser.add_argument("--users", type=int, help="По умолчанию products / 100")
+        parser.add_argument("--wishlist-size", type=int, default=3, help="Позиций в корзине на пользователя")
+        parser.add_argument("--orders-per-user", type=int, default=2)
+        parser.add_argument("--order-size", type=int, default=3, help="Позиций в заказе")
+        parser.add_argument("--password", default="bench1234", help="Пароль всех пользователей")
+        parser.add_argument("--prefix", default="bench", help="Префикс slug категорий и имен пользователей")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch_size = options["batch_size"]
+        products_count = options["products"]
+        categories_count = options["categories"] or max(1, products_count // 100)
+        users_count = options["users"] or max(1, products_count // 100)
+
+        with transaction.atomic():
+            categories = Category.objects.bulk_create(
+                (Category(title=f"Категория {i}", slug=f"{prefix}-category-{i}") for i in range(categories_count)),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Категорий: {len(categories)}")
+
+            prices = {}
+            for start in range(0, products_count, batch_size):
+                batch = Product.objects.bulk_create(
+                    Product(
+                        title=" ".join(rnd.sample(WORDS, 3)),
+                        description=" ".join(rnd.sample(WORDS, 5)),
+                        category_id=categories[rnd.randrange(categories_count)].id,
+                        price=rnd.randint(1, 100_000),
+                    )
+                    for _ in range(start, min(start + batch_size, products_count))
+                )
+                prices.update((product.id, product.price) for product in batch)
+                self.stdout.write(f"Продуктов: {start + len(batch)}")
+            product_ids = list(prices)
+
+            password = make_password(options["password"])
+            users = User.objects.bulk_create(
+                (User(username=f"{prefix}-user-{i}", password=password) for i in range(users_count)),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Пользователей: {len(users)}")
+
+            wishlists = []
+            for user in users:
+                for product_id in rnd.sample(product_ids, min(options["wishlist_size"], len(product_ids))):
+                    wishlists.append(WishList(user_id=user.id, product_id=product_id, count=rnd.randint(1, 5)))
+            WishList.objects.bulk_create(wishlists, batch_size=batch_size)
+            self.stdout.write(f"Позиций в корзинах: {len(wishlists)}")
+
+            orders = []
+            lines = []
+            for user in users:
+                for _ in range(options["orders_per_user"]):
+                    order_lines = [
+                        (product_id, rnd.randint(1, 5))
+                        for product_id in rnd.sample(product_ids, min(options["order_size"], len(product_ids)))
+                    ]
+                    total = sum(prices[product_id] * count for product_id, count in order_lines)
+                    orders.append(Order(user_id=user.id, status=rnd.choice(STATUSES), total=total))
+                    lines.append(order_lines)
+            orders = Order.objects.bulk_create(orders, batch_size=batch_size)
+            OrderProduct.objects.bulk_create(
+                (
+                    OrderProduct(order_id=order.id, product_id=product_id, count=count, price=prices[product_id])
+                    for order, order_lines in zip(orders, lines)
+                    for product_id, count in order_lines
+                ),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Заказов: {len(orders)}")
+            rebuild_stats()
+            rebuild_related()
+
+        catalog_cache.bump()
+        price_index.invalidate()
+        suggest_index.invalidate()
+        self.stdout.write(self.style.SUCCESS("Данные сгенерированы"))
@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from onlineStore.importer import FORMATS, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = "Потоковый импорт продуктов и категорий из NDJSON или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="По умолчанию по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--errors-file", help="Куда записать построчный отчет об ошибках (JSON)")
+
+    def handle(self, *args, **options):
+        format = options["format"] or detect_format(options["path"])
+        try:
+            stream = open(options["path"], "rb")
+        except OSError as e:
+            raise CommandError(f"Не удалось открыть файл: {e}")
+        with stream:
+            result = import_products(stream, format=format, batch_size=options["batch_size"], progress=self.progress)
+
+        if options["errors_file"]:
+            with open(options["errors_file"], "w", encoding="utf-8") as file:
+                json.dump(result.errors, file, ensure_ascii=False, indent=2)
+        for error in result.errors[:20]:
+            self.stderr.write(f"строка {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {result.rows}, импортировано: {result.imported}, "
+            f"новых категорий: {result.categories_created}, ошибок: {result.error_count}"
+        ))
+
+    def progress(self, result):
+        self.stdout.write(f"обработано строк: {result.rows}, импортировано: {result.imported}, ошибок: {result.error_count}")
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from onlineStore.models import RelatedProduct
+from onlineStore.related import rebuild_related
+
+
+class Command(BaseCommand):
+    help = "Пересчитать совместные покупки и соседей \"Часто покупают вместе\" с нуля"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        pairs = rebuild_related()
+        self.stdout.write(self.style.SUCCESS(
+            f"Совместные покупки пересчитаны за {time.perf_counter() - start:.2f} с, пар: {pairs}, "
+            f"продуктов с соседями: {RelatedProduct.objects.values('product_id').distinct().count()}"
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from onlineStore.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Перестроить полнотекстовый индекс продуктов"
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Индекс перестроен, продуктов: {count}"))
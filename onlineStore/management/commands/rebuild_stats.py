@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from onlineStore.models import DailyRevenue, CategoryStats
+from onlineStore.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитать предрассчитанную статистику продаж и каталога с нуля"
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Статистика пересчитана, дней: {DailyRevenue.objects.count()}, категорий: {CategoryStats.objects.count()}"
+        ))
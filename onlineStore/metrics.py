@@ -0,0 +1,242 @@
+import inspect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Метрики запросов к API: время обработки, число и время запросов к БД,
+# время сериализации и размер ответа. Гистограммы живут внутри процесса
+# и отдаются эндпоинтом /api/metrics в текстовом формате Prometheus.
+# Запросы, не попавшие ни в один маршрут, учитываются под одной меткой UNMATCHED,
+# чтобы случайные пути не раздували число гистограмм.
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "API_METRICS", {})
+
+PATH_PREFIX = _config.get("PATH_PREFIX", "/api/")
+SLOW_REQUEST_SECONDS = _config.get("SLOW_REQUEST_SECONDS")
+MAX_LOGGED_QUERIES = _config.get("MAX_LOGGED_QUERIES", 50)
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {
+    "api_request_duration_seconds": ("Время обработки запроса", TIME_BUCKETS),
+    "api_db_queries": ("Число запросов к БД на запрос", COUNT_BUCKETS),
+    "api_db_duration_seconds": ("Время запросов к БД на запрос", TIME_BUCKETS),
+    "api_serialization_duration_seconds": ("Время сериализации ответа", TIME_BUCKETS),
+    "api_response_bytes": ("Размер тела ответа", SIZE_BUCKETS),
+}
+
+UNMATCHED = "<unmatched>"
+
+current_request = ContextVar("current_request", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.sql = []
+        self.view_end = None
+        self.db_time_at_view_end = 0.0
+
+    def mark_view_end(self):
+        # Первая отметка остается: render_rows ставит ее раньше обертки обработчика
+        if self.view_end is not None:
+            return
+        self.view_end = time.perf_counter()
+        self.db_time_at_view_end = self.db_time
+
+    def serialization_time(self, end):
+        if self.view_end is None:
+            return None
+        return max(end - self.view_end - (self.db_time - self.db_time_at_view_end), 0.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._histograms = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, operation, value):
+        with self._lock:
+            key = (name, operation)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+    def count_request(self, operation, status):
+        with self._lock:
+            key = (operation, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+    def render(self, gauges=()):
+        lines = [
+            "# HELP api_requests_total Число запросов к API",
+            "# TYPE api_requests_total counter",
+        ]
+        with self._lock:
+            for (operation, status), value in sorted(self._requests.items()):
+                lines.append(f'api_requests_total{{operation="{escape(operation)}",status="{status}"}} {value}')
+            for name, (help_text, _) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, operation), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'operation="{escape(operation)}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{label}}} {histogram.count}")
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    # Подключается к каждому соединению с БД (см. signals.py) и учитывает запросы текущего API-запроса
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+        if SLOW_REQUEST_SECONDS is not None and len(stats.sql) < MAX_LOGGED_QUERIES:
+            stats.sql.append(sql)
+
+
+def instrument_operations(api):
+    # Оборачивает обработчики всех операций, чтобы отделить время обработчика от сериализации
+    for _prefix, router in api._routers:
+        for path_view in router.path_operations.values():
+            for operation in path_view.operations:
+                operation.view_func = mark_view_end(operation.view_func)
+
+
+def mark_view_end(view):
+    if getattr(view, "_marks_view_end", False):
+        return view
+
+    if inspect.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, **kwargs):
+            try:
+                return await view(request, **kwargs)
+            finally:
+                stats = current_request.get()
+                if stats is not None:
+                    stats.mark_view_end()
+    else:
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            try:
+                return view(request, **kwargs)
+            finally:
+                stats = current_request.get()
+                if stats is not None:
+                    stats.mark_view_end()
+
+    wrapper._marks_view_end = True
+    return wrapper
+
+
+class MetricsMiddleware:
+    # Синхронный и асинхронный: под ASGI асинхронные эндпоинты не уходят в поток ради middleware
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path.startswith(PATH_PREFIX):
+            return self.get_response(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter())
+        return response
+
+    async def __acall__(self, request):
+        if not request.path.startswith(PATH_PREFIX):
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter())
+        return response
+
+    def record(self, request, response, stats, end):
+        match = request.resolver_match
+        operation = f"{request.method} {match.route if match else UNMATCHED}"
+        duration = end - stats.start
+        registry.count_request(operation, response.status_code)
+        registry.observe("api_request_duration_seconds", operation, duration)
+        registry.observe("api_db_queries", operation, stats.queries)
+        registry.observe("api_db_duration_seconds", operation, stats.db_time)
+        serialization = stats.serialization_time(end)
+        if serialization is not None:
+            registry.observe("api_serialization_duration_seconds", operation, serialization)
+        if not response.streaming:
+            registry.observe("api_response_bytes", operation, len(response.content))
+        if SLOW_REQUEST_SECONDS is not None and duration >= SLOW_REQUEST_SECONDS:
+            logger.warning(
+                "Медленный запрос %s %s: %.3f с, запросов к БД %d (%.3f с)\n%s",
+                request.method, request.get_full_path(), duration, stats.queries, stats.db_time,
+                "\n".join(stats.sql),
+            )
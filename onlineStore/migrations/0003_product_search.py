@@ -0,0 +1,57 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:12
+
+import django.db.models.deletion
+import onlineStore.models
+from django.db import migrations, models
+
+
+CREATE_SEARCH_INDEX = [
+    """CREATE VIRTUAL TABLE "onlineStore_product_fts" USING fts5(
+        title, description,
+        content='onlineStore_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER "onlineStore_product_fts_ai" AFTER INSERT ON "onlineStore_product" BEGIN
+        INSERT INTO "onlineStore_product_fts"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER "onlineStore_product_fts_ad" AFTER DELETE ON "onlineStore_product" BEGIN
+        INSERT INTO "onlineStore_product_fts"("onlineStore_product_fts", rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER "onlineStore_product_fts_au" AFTER UPDATE OF title, description ON "onlineStore_product" BEGIN
+        INSERT INTO "onlineStore_product_fts"("onlineStore_product_fts", rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO "onlineStore_product_fts"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """INSERT INTO "onlineStore_product_fts"("onlineStore_product_fts") VALUES ('rebuild')""",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS "onlineStore_product_fts_au"',
+    'DROP TRIGGER IF EXISTS "onlineStore_product_fts_ad"',
+    'DROP TRIGGER IF EXISTS "onlineStore_product_fts_ai"',
+    'DROP TABLE IF EXISTS "onlineStore_product_fts"',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlineStore', '0002_alter_category_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearch',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='onlineStore.product')),
+                ('title', onlineStore.models.SearchField()),
+                ('description', onlineStore.models.SearchField()),
+                ('document', onlineStore.models.SearchField(db_column='onlineStore_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'onlineStore_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
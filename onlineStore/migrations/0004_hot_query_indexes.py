@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_wishlist_duplicates(apps, schema_editor):
+    WishList = apps.get_model('onlineStore', 'WishList')
+    duplicates = (
+        WishList.objects.values('user_id', 'product_id')
+        .annotate(rows=models.Count('id'), total=models.Sum('count'), keep=models.Min('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        WishList.objects.filter(id=duplicate['keep']).update(count=duplicate['total'])
+        WishList.objects.filter(
+            user_id=duplicate['user_id'], product_id=duplicate['product_id']
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlineStore', '0003_product_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(unique=True, verbose_name='Slug'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-datetime'], name='onlineStore_user_id_56192c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='onlineStore_categor_275e34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='onlineStore_price_30d4c7_idx'),
+        ),
+        migrations.RunPython(merge_wishlist_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wishlist',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='wishlist_user_product_unique'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlineStore', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Дата')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('items', models.IntegerField(default=0, verbose_name='Товаров')),
+            ],
+            options={
+                'verbose_name': 'Выручка за день',
+                'verbose_name_plural': 'Выручка по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('items', models.IntegerField(default=0, verbose_name='Товаров')),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='revenue', to='onlineStore.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Выручка категории',
+                'verbose_name_plural': 'Выручка по категориям',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.IntegerField(default=0, verbose_name='Продуктов')),
+                ('price_min', models.IntegerField(null=True, verbose_name='Минимальная цена')),
+                ('price_max', models.IntegerField(null=True, verbose_name='Максимальная цена')),
+                ('price_avg', models.FloatField(null=True, verbose_name='Средняя цена')),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='onlineStore.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Статистика категории',
+                'verbose_name_plural': 'Статистика категорий',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('items', models.IntegerField(default=0, verbose_name='Товаров')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='revenue', to='onlineStore.product', verbose_name='Продукт')),
+            ],
+            options={
+                'verbose_name': 'Выручка продукта',
+                'verbose_name_plural': 'Выручка по продуктам',
+                'indexes': [models.Index(fields=['-revenue'], name='onlineStore_revenue_aa842c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlineStore', '0005_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='Заказов вместе')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='onlineStore.product', verbose_name='Продукт')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='onlineStore.product', verbose_name='Купленный вместе')),
+            ],
+            options={
+                'verbose_name': 'Совместная покупка',
+                'verbose_name_plural': 'Совместные покупки',
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='unique_product_pair')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиция')),
+                ('count', models.IntegerField(verbose_name='Заказов вместе')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='onlineStore.product', verbose_name='Продукт')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='onlineStore.product', verbose_name='Купленный вместе')),
+            ],
+            options={
+                'verbose_name': 'Часто покупают вместе',
+                'verbose_name_plural': 'Часто покупают вместе',
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='unique_related_rank')],
+            },
+        ),
+    ]
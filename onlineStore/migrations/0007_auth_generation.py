@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlineStore', '0006_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthGeneration',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Пользователь')),
+                ('generation', models.BigIntegerField(default=0, verbose_name='Поколение')),
+            ],
+            options={
+                'verbose_name': 'Поколение учетных данных',
+                'verbose_name_plural': 'Поколения учетных данных',
+            },
+        ),
+    ]
@@ -1,16 +1,15 @@
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth.models import User
 
 
 class Category(models.Model):
     title = models.CharField(max_length=50, verbose_name="Название")
-    slug = models.SlugField(verbose_name="Slug")
+    slug = models.SlugField(unique=True, verbose_name="Slug")
 
     def __str__(self):
         return self.title
     
     class Meta:
-        unique_together = (('slug'),)
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
 
@@ -24,10 +23,75 @@ class Product(models.Model):
 
     def __str__(self):
         return self.title
+
+    # Категория и цена на момент загрузки: signals сравнивает с ними при сохранении без лишнего SELECT
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_loaded()
+
+    def remember_loaded(self):
+        deferred = self.get_deferred_fields()
+        if "category_id" not in deferred and "price" not in deferred:
+            self._loaded_values = (self.category_id, self.price)
+        else:
+            self.__dict__.pop("_loaded_values", None)
     
     class Meta:
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
+        indexes = [
+            models.Index(fields=["category", "price"]),
+            models.Index(fields=["price"]),
+        ]
+
+
+class SearchField(models.TextField):
+    pass
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class ProductSearch(models.Model):
+    # Виртуальная таблица FTS5 поверх onlineStore_product, синхронизируется триггерами
+    product = models.OneToOneField(Product, on_delete=models.DO_NOTHING, primary_key=True, db_column="rowid", related_name="search")
+    title = SearchField()
+    description = SearchField()
+    document = SearchField(db_column="onlineStore_product_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "onlineStore_product_fts"
+
+
+class WishListManager(models.Manager):
+    def add_products(self, user, items):
+        # Один INSERT ... ON CONFLICT на позицию: строка создается, только если продукт существует,
+        # а при повторном добавлении количество увеличивается атомарно
+        quote = connections[self.db].ops.quote_name
+        table = quote(self.model._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (user_id, product_id, count) "
+            f"SELECT %s, id, %s FROM {quote(Product._meta.db_table)} WHERE id = %s "
+            f"ON CONFLICT (user_id, product_id) DO UPDATE SET count = {table}.count + excluded.count"
+        )
+        with connections[self.db].cursor() as cursor:
+            cursor.executemany(sql, [(user.id, count, product_id) for product_id, count in items])
+            return cursor.rowcount
 
 
 class WishList(models.Model):
@@ -35,9 +99,14 @@ class WishList(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Продукт")
     count = models.IntegerField(verbose_name="Количество")
 
+    objects = WishListManager()
+
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product"], name="wishlist_user_product_unique"),
+        ]
 
 
 class Order(models.Model):
@@ -50,11 +119,15 @@ class Order(models.Model):
         return str(self.id)
     
     def get_total_sum(self):
-        return sum(item.get_sum() for item in self.products.all())
+        total = self.products.aggregate(total=models.Sum(models.F("count") * models.F("price")))["total"]
+        return total or 0
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=["user", "-datetime"]),
+        ]
 
 
 class OrderProduct(models.Model):
@@ -64,8 +137,101 @@ class OrderProduct(models.Model):
     price = models.IntegerField(verbose_name="Цена")
 
     def get_sum(self):
-        return self.count * self.product.price
+        return self.count * self.price
 
     class Meta:
         verbose_name = "Детали заказа"
-        verbose_name_plural = "Детали заказов"
\ No newline at end of file
+        verbose_name_plural = "Детали заказов"
+
+
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True, verbose_name="Дата")
+    revenue = models.BigIntegerField(default=0, verbose_name="Выручка")
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+    items = models.IntegerField(default=0, verbose_name="Товаров")
+
+    class Meta:
+        verbose_name = "Выручка за день"
+        verbose_name_plural = "Выручка по дням"
+
+
+class CategoryRevenue(models.Model):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, verbose_name="Категория", related_name="revenue")
+    revenue = models.BigIntegerField(default=0, verbose_name="Выручка")
+    items = models.IntegerField(default=0, verbose_name="Товаров")
+
+    class Meta:
+        verbose_name = "Выручка категории"
+        verbose_name_plural = "Выручка по категориям"
+
+
+class ProductRevenue(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, verbose_name="Продукт", related_name="revenue")
+    revenue = models.BigIntegerField(default=0, verbose_name="Выручка")
+    items = models.IntegerField(default=0, verbose_name="Товаров")
+
+    class Meta:
+        verbose_name = "Выручка продукта"
+        verbose_name_plural = "Выручка по продуктам"
+        indexes = [
+            models.Index(fields=["-revenue"]),
+        ]
+
+
+class CategoryStats(models.Model):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, verbose_name="Категория", related_name="stats")
+    product_count = models.IntegerField(default=0, verbose_name="Продуктов")
+    price_min = models.IntegerField(null=True, verbose_name="Минимальная цена")
+    price_max = models.IntegerField(null=True, verbose_name="Максимальная цена")
+    price_avg = models.FloatField(null=True, verbose_name="Средняя цена")
+
+    class Meta:
+        verbose_name = "Статистика категории"
+        verbose_name_plural = "Статистика категорий"
+
+
+class ProductPair(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Продукт", related_name="+")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Купленный вместе", related_name="+")
+    count = models.IntegerField(default=0, verbose_name="Заказов вместе")
+
+    class Meta:
+        verbose_name = "Совместная покупка"
+        verbose_name_plural = "Совместные покупки"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "related"], name="unique_product_pair"),
+        ]
+
+
+class RelatedProduct(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Продукт", related_name="related_products")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Купленный вместе", related_name="related_to")
+    rank = models.PositiveSmallIntegerField(verbose_name="Позиция")
+    count = models.IntegerField(verbose_name="Заказов вместе")
+
+    class Meta:
+        verbose_name = "Часто покупают вместе"
+        verbose_name_plural = "Часто покупают вместе"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="unique_related_rank"),
+        ]
+
+
+class AuthGeneration(models.Model):
+    # id - код пользователя, 0 - общее поколение всех пользователей
+    id = models.BigIntegerField(primary_key=True, verbose_name="Пользователь")
+    generation = models.BigIntegerField(default=0, verbose_name="Поколение")
+
+    class Meta:
+        verbose_name = "Поколение учетных данных"
+        verbose_name_plural = "Поколения учетных данных"
+
+
+class CacheGeneration(models.Model):
+    # Поколения каталога, заказов и пользователей для ключей кэша и ETag (cache.Generation)
+    key = models.CharField(max_length=100, primary_key=True, verbose_name="Ключ")
+    value = models.BigIntegerField(verbose_name="Поколение")
+
+    class Meta:
+        verbose_name = "Поколение кэша"
+        verbose_name_plural = "Поколения кэша"
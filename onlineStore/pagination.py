@@ -0,0 +1,161 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from ninja import Field, Schema
+from ninja.errors import HttpError
+from .cache import catalog_cache
+from .renderers import dumps, render_rows, values_plan
+
+
+# Курсорная пагинация по id и потоковая выдача NDJSON.
+# Тело ответа остается списком, курсор следующей страницы приходит в заголовке X-Next-Cursor.
+# С fast=True строки собираются из .values_list() по полям схемы (см. renderers.py).
+# Асинхронные варианты (apaginate_or_stream) используют тот же кэш каталога и ключи страниц.
+
+_config = getattr(settings, "API_PAGINATION", {})
+
+DEFAULT_LIMIT = _config.get("DEFAULT_LIMIT", 100)
+MAX_LIMIT = _config.get("MAX_LIMIT", 1000)
+STREAM_CHUNK_SIZE = _config.get("STREAM_CHUNK_SIZE", 2000)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(Schema):
+    cursor: str = Field(None, description="Курсор следующей страницы")
+    limit: int = Field(DEFAULT_LIMIT, description=f"Размер страницы, не больше {MAX_LIMIT}")
+    stream: bool = Field(False, description="Потоковая выдача всех записей в формате NDJSON")
+
+
+def encode_cursor(last_id):
+    return urlsafe_b64encode(f"id:{last_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        value = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        prefix, last_id = value.split(":", 1)
+        if prefix != "id":
+            raise ValueError
+        return int(last_id)
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise HttpError(400, "Некорректный курсор")
+
+
+def keyset_queryset(queryset, cursor):
+    queryset = queryset.order_by("id")
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+    return queryset
+
+
+def page_limit(page: PageParams):
+    if page.limit < 1:
+        raise HttpError(400, "Размер страницы должен быть положительным")
+    return min(page.limit, MAX_LIMIT)
+
+
+def split_page(rows, limit, plan):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1].id if plan is None else rows[-1]["id"])
+    return rows, None
+
+
+def get_page(queryset, page: PageParams, plan=None):
+    limit = page_limit(page)
+    rows = keyset_queryset(queryset, page.cursor)[:limit + 1]
+    return split_page(list(rows) if plan is None else plan.rows(rows), limit, plan)
+
+
+async def aget_page(queryset, page: PageParams, plan=None):
+    limit = page_limit(page)
+    rows = keyset_queryset(queryset, page.cursor)[:limit + 1]
+    return split_page([row async for row in rows] if plan is None else await plan.arows(rows), limit, plan)
+
+
+def page_cache_key(cache_key, page: PageParams, fields, fast):
+    # Быстрый и проверяемый пути кладут в кэш разные словари, поэтому ключи у них разные
+    return (*cache_key, page.cursor, page.limit, ",".join(fields or ()), fast)
+
+
+def cached_page(queryset, page: PageParams, schema, plan):
+    # Значение для кэша каталога: словари, а не экземпляры моделей
+    rows, next_cursor = get_page(queryset, page, plan)
+    if plan is None:
+        rows = [schema.from_orm(row).dict() for row in rows]
+    return rows, next_cursor
+
+
+def finish_page(response, rows, next_cursor, fast):
+    if next_cursor is not None:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    if fast:
+        return render_rows(response, rows)
+    return rows
+
+
+def paginate(queryset, response, page: PageParams, cache_key=None, schema=None, fast=False, fields=None):
+    plan = values_plan(schema, fields) if fast else None
+    if cache_key is None:
+        rows, next_cursor = get_page(queryset, page, plan)
+    else:
+        rows, next_cursor = catalog_cache.get_or_set(
+            page_cache_key(cache_key, page, fields, fast), lambda: cached_page(queryset, page, schema, plan)
+        )
+    return finish_page(response, rows, next_cursor, fast)
+
+
+async def apaginate(queryset, response, page: PageParams, cache_key=None, schema=None, fast=False, fields=None):
+    plan = values_plan(schema, fields) if fast else None
+    if cache_key is None:
+        rows, next_cursor = await aget_page(queryset, page, plan)
+    else:
+        rows, next_cursor = await catalog_cache.aget_or_set(
+            page_cache_key(cache_key, page, fields, fast), lambda: cached_page(queryset, page, schema, plan)
+        )
+    return finish_page(response, rows, next_cursor, fast)
+
+
+def stream_ndjson(queryset, schema, cursor=None, fast=False, fields=None):
+    queryset = keyset_queryset(queryset, cursor)
+    if fast:
+        rows = values_plan(schema, fields).iterator(queryset, chunk_size=STREAM_CHUNK_SIZE)
+        lines = (dumps(row) + b"\n" for row in rows)
+    else:
+        rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        lines = (schema.from_orm(row).json(ensure_ascii=False) + "\n" for row in rows)
+    return StreamingHttpResponse(lines, content_type="application/x-ndjson; charset=utf-8")
+
+
+def astream_ndjson(queryset, schema, cursor=None, fields=None):
+    # Асинхронный итератор для ASGI, всегда через быстрый путь. Пачки читаются по курсору id:
+    # .aiterator() Django для values_list выполняет запрос вне потока и падает в async-контексте
+    plan = values_plan(schema, fields)
+    queryset = keyset_queryset(queryset, cursor)
+
+    async def lines():
+        chunk = queryset
+        while True:
+            rows = await plan.arows(chunk[:STREAM_CHUNK_SIZE])
+            for row in rows:
+                yield dumps(row) + b"\n"
+            if len(rows) < STREAM_CHUNK_SIZE:
+                return
+            chunk = queryset.filter(id__gt=rows[-1]["id"])
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson; charset=utf-8")
+
+
+def paginate_or_stream(queryset, response, page: PageParams, schema, cache_key=None, fast=False, fields=None):
+    # fields - кортеж из renderers.parse_fields, работает только с fast=True
+    if page.stream:
+        return stream_ndjson(queryset, schema, page.cursor, fast, fields)
+    return paginate(queryset, response, page, cache_key, schema, fast, fields)
+
+
+async def apaginate_or_stream(queryset, response, page: PageParams, schema, cache_key=None, fast=False, fields=None):
+    if page.stream:
+        return astream_ndjson(queryset, schema, page.cursor, fields)
+    return await apaginate(queryset, response, page, cache_key, schema, fast, fields)
@@ -0,0 +1,91 @@
+import inspect
+import threading
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from ninja.errors import HttpError
+from .lru import TTLCache
+from .tokens import get_generations
+
+
+# Кэш прав пользователей для проверок в обработчиках API.
+# Пользователь из кэша учетных данных приходит копией без _perm_cache,
+# поэтому has_perm каждый раз читал права пользователя и его групп из БД.
+# Здесь множество прав хранится по id пользователя и сбрасывается
+# сигналами (signals.py) при изменении пользователя, его групп и прав групп.
+# Изменения из других процессов видны через поколение пользователя, как в auth.CredentialCache.
+
+
+class PermissionCache:
+    def __init__(self, max_size=1024, ttl=300):
+        self._entries = TTLCache(max_size, ttl)
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get_permissions(self, user):
+        generations = get_generations(user.pk)
+        entry = self._entries.get(user.pk)
+        if entry is not None and entry[1] == generations:
+            return entry[0]
+        with self._lock:
+            version = (self._epoch, self._versions.get(user.pk, 0))
+        permissions = frozenset(user.get_all_permissions())
+        with self._lock:
+            # Права могли измениться, пока шел запрос к БД: тогда результат не кэшируется
+            if version == (self._epoch, self._versions.get(user.pk, 0)):
+                self._entries.set(user.pk, (permissions, generations))
+        return permissions
+
+    def has_perms(self, user, perms):
+        if not user.is_active:
+            return False
+        if user.is_superuser:
+            return True
+        permissions = self.get_permissions(user)
+        return all(perm in permissions for perm in perms)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._epoch += 1
+
+    def reset_stats(self):
+        self._entries.reset_stats()
+
+    def stats(self):
+        return self._entries.stats()
+
+
+_config = getattr(settings, "AUTH_PERMISSION_CACHE", {})
+
+permission_cache = PermissionCache(
+    max_size=_config.get("MAX_SIZE", 1024),
+    ttl=_config.get("TTL", 300),
+)
+
+
+def require_perm(*perms):
+    # Декоратор операции: 403, если у request.auth нет всех перечисленных прав
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if not await sync_to_async(permission_cache.has_perms)(request.auth, perms):
+                    raise HttpError(403, "Не достаточно прав")
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not permission_cache.has_perms(request.auth, perms):
+                    raise HttpError(403, "Не достаточно прав")
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
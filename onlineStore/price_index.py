@@ -0,0 +1,199 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from django.conf import settings
+from .models import Product
+
+
+# Индекс цен внутри процесса для фильтра продуктов по цене и категории.
+# Для всех продуктов и для каждой категории хранятся два массива array("q"),
+# отсортированные по (цена, id): цены и id. Диапазон цен ищется через bisect.
+# Индекс строится при первом обращении, обновляется сигналами Product после коммита
+# и перестраивается целиком через MAX_AGE секунд, чтобы подхватить изменения
+# из других процессов и массовые операции без сигналов.
+# Построение идет вне блокировки чтения, готовые массивы подменяются целиком,
+# изменения от сигналов за время построения применяются к новым массивам повторно.
+# Пока один поток строит, устаревший по времени индекс продолжает отвечать,
+# а сброшенный через invalidate() - нет: lookup() возвращает None, и фильтр идет в БД.
+# Если в диапазон попадает больше MAX_ROWS продуктов, дешевле обычный запрос по диапазону:
+# выборка строк по списку id тогда медленнее, чем чтение по индексу БД.
+# version() меняется при каждом построении и изменении и входит в ETag фильтра (conditional.py).
+
+_config = getattr(settings, "PRICE_INDEX", {})
+
+ENABLED = _config.get("ENABLED", False)
+MAX_AGE = _config.get("MAX_AGE", 300)
+MAX_ROWS = _config.get("MAX_ROWS", 5000)
+BUILD_CHUNK_SIZE = 10_000
+
+
+def find(prices, ids, price, id):
+    lo = bisect_left(prices, price)
+    hi = bisect_right(prices, price, lo)
+    return bisect_left(ids, id, lo, hi)
+
+
+def diff_sorted(expected, actual):
+    # Слияние двух последовательностей (цена, id), отсортированных одинаково: (нет в индексе, лишние в индексе)
+    missing, extra = [], []
+    expected, actual = iter(expected), iter(actual)
+    left, right = next(expected, None), next(actual, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and left < right):
+            missing.append(left[1])
+            left = next(expected, None)
+        elif left is None or right < left:
+            extra.append(right[1])
+            right = next(actual, None)
+        else:
+            left, right = next(expected, None), next(actual, None)
+    return missing, extra
+
+
+class PriceIndex:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._built_at = None
+        self._valid = False
+        self._version = 0
+        self._epoch = 0
+        self._pending = None
+        self._all = (array("q"), array("q"))
+        self._categories = {}
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+
+    def build(self):
+        prices, ids = array("q"), array("q")
+        categories = {}
+        rows = Product.objects.order_by("price", "id").values_list("category_id", "price", "id")
+        for category_id, price, id in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            prices.append(price)
+            ids.append(id)
+            entry = categories.get(category_id)
+            if entry is None:
+                entry = categories[category_id] = (array("q"), array("q"))
+            entry[0].append(price)
+            entry[1].append(id)
+        return (prices, ids), categories
+
+    def _fresh(self):
+        return self._valid and time.monotonic() - self._built_at <= self.max_age
+
+    def ensure(self):
+        # True, если индексу можно отвечать
+        if self._fresh():
+            return True
+        if not self._build_lock.acquire(blocking=False):
+            return self._valid
+        try:
+            with self._lock:
+                if self._fresh():
+                    return True
+                epoch, started, self._pending = self._epoch, time.monotonic(), []
+            products, categories = self.build()
+            with self._lock:
+                for id, old, new in self._pending:
+                    self._apply(products, categories, id, old, new)
+                self._all, self._categories = products, categories
+                self._built_at = started
+                # invalidate() во время построения: строки могли быть прочитаны до изменения
+                self._valid = self._epoch == epoch
+                self._version = time.time_ns()
+                return self._valid
+        finally:
+            with self._lock:
+                self._pending = None
+            self._build_lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self._valid = False
+            self._epoch += 1
+
+    def version(self):
+        with self._lock:
+            return self._version if self._valid else 0
+
+    def lookup(self, min_price=None, max_price=None, category_id=None, limit=None):
+        # Список id по (цена, id) или None: индекс не готов либо найдено больше limit
+        if not self.ensure():
+            return None
+        with self._lock:
+            prices, ids = self._all if category_id is None else self._categories.get(category_id, (array("q"), array("q")))
+            lo = 0 if min_price is None else bisect_left(prices, min_price)
+            hi = len(prices) if max_price is None else bisect_right(prices, max_price)
+            if limit is not None and hi - lo > limit:
+                return None
+            return ids[lo:max(lo, hi)].tolist()
+
+    def _insert(self, prices, ids, price, id):
+        position = find(prices, ids, price, id)
+        if position < len(ids) and ids[position] == id and prices[position] == price:
+            return
+        prices.insert(position, price)
+        ids.insert(position, id)
+
+    def _remove(self, prices, ids, price, id):
+        position = find(prices, ids, price, id)
+        if position < len(ids) and ids[position] == id and prices[position] == price:
+            del prices[position]
+            del ids[position]
+
+    def _apply(self, products, categories, id, old, new):
+        # Повторное применение безопасно: вставка и удаление проверяют, есть ли уже запись
+        if old is not None:
+            category_id, price = old
+            self._remove(*products, price, id)
+            if category_id in categories:
+                self._remove(*categories[category_id], price, id)
+        if new is not None:
+            category_id, price = new
+            self._insert(*products, price, id)
+            entry = categories.get(category_id)
+            if entry is None:
+                entry = categories[category_id] = (array("q"), array("q"))
+            self._insert(*entry, price, id)
+
+    def move(self, id, old, new):
+        # old и new - (категория, цена) или None
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((id, old, new))
+            if self._valid:
+                self._apply(self._all, self._categories, id, old, new)
+                self._version = time.time_ns()
+
+    def add(self, id, category_id, price):
+        self.move(id, None, (category_id, price))
+
+    def remove(self, id, category_id, price):
+        self.move(id, (category_id, price), None)
+
+    def check(self):
+        # Сверка с БД: id продуктов, которых нет в индексе или которые в индексе лишние (в том числе по категориям)
+        self.ensure()
+        (prices, ids), categories = self.build()
+        with self._lock:
+            missing, extra = diff_sorted(zip(prices, ids), zip(*self._all))
+            for category_id in set(categories) | set(self._categories):
+                expected = categories.get(category_id, (array("q"), array("q")))
+                actual = self._categories.get(category_id, (array("q"), array("q")))
+                category_missing, category_extra = diff_sorted(zip(*expected), zip(*actual))
+                missing.extend(category_missing)
+                extra.extend(category_extra)
+        return {"products": len(ids), "missing": sorted(set(missing)), "extra": sorted(set(extra))}
+
+    def stats(self):
+        with self._lock:
+            arrays = [self._all, *self._categories.values()]
+            return {
+                "built": self._valid,
+                "products": len(self._all[1]),
+                "categories": len(self._categories),
+                "bytes": sum(prices.itemsize * len(prices) + ids.itemsize * len(ids) for prices, ids in arrays),
+            }
+
+
+price_index = PriceIndex(max_age=MAX_AGE)
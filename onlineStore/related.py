@@ -0,0 +1,159 @@
+from collections import Counter, defaultdict
+from heapq import nlargest
+from itertools import groupby, permutations, product
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import OrderProduct, Product, ProductPair, RelatedProduct
+from .stats import EXCLUDED_STATUSES, increment, is_counted
+
+
+# "Часто покупают вместе" по совместным покупкам.
+# ProductPair - ненулевые элементы разреженной матрицы: в скольких заказах продукты были вместе, в обе стороны.
+# RelatedProduct - первые TOP_K соседей каждого продукта с позицией,
+# эндпоинт читает их одним запросом по индексу (product, rank).
+# Новый заказ прибавляет свои пары в той же транзакции и пересчитывает соседей только своих продуктов,
+# смена статуса на исключенный из статистики (STATS_EXCLUDED_STATUSES) и обратно вычитает или прибавляет пары,
+# удаление заказа вычитает его пары. Пары удаленного продукта уходят каскадом.
+# Заказы больше MAX_ORDER_PRODUCTS продуктов пропускаются: пар в них квадратично много, а связь слабая.
+# rebuild_related() пересчитывает матрицу с нуля по диапазонам id продуктов, каждый в своей короткой транзакции:
+# блокировка записи SQLite держится на время одного диапазона, а не всего пересчета.
+# Диапазон сначала очищается (транзакции IMMEDIATE берут блокировку сразу), потом считается под ней,
+# поэтому заказы, пришедшие между диапазонами, не теряются и не учитываются дважды.
+
+_config = getattr(settings, "RELATED_PRODUCTS", {})
+
+TOP_K = _config.get("TOP_K", 10)
+MAX_ORDER_PRODUCTS = _config.get("MAX_ORDER_PRODUCTS", 50)
+REBUILD_RANGE_SIZE = _config.get("REBUILD_RANGE_SIZE", 2000)
+BATCH_SIZE = 5000
+IDS_CHUNK_SIZE = 500
+
+
+def order_pairs(product_ids):
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) > MAX_ORDER_PRODUCTS:
+        return []
+    return permutations(product_ids, 2)
+
+
+def count_pairs(orders):
+    # Counter.update по парам каждого заказа: подсчет идет в цикле на C, без Python-кода на пару
+    pairs = Counter()
+    lines = (
+        OrderProduct.objects.filter(order__in=orders)
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for _, group in groupby(lines, key=lambda line: line[0]):
+        pairs.update(order_pairs(product_id for _, product_id in group))
+    return pairs
+
+
+def refresh_related(product_ids):
+    product_ids = sorted(set(product_ids))
+    for start in range(0, len(product_ids), IDS_CHUNK_SIZE):
+        chunk = product_ids[start:start + IDS_CHUNK_SIZE]
+        ranked = (
+            ProductPair.objects.filter(product_id__in=chunk, count__gt=0)
+            .annotate(rank=Window(RowNumber(), partition_by=F("product_id"), order_by=[F("count").desc(), F("related_id")]))
+            .filter(rank__lte=TOP_K)
+            .values_list("product_id", "related_id", "count", "rank")
+        )
+        rows = [RelatedProduct(product_id=product_id, related_id=related_id, count=count, rank=rank)
+                for product_id, related_id, count, rank in ranked]
+        RelatedProduct.objects.filter(product_id__in=chunk).delete()
+        RelatedProduct.objects.bulk_create(rows)
+
+
+def apply_pairs(pairs, sign=1):
+    if not pairs:
+        return
+    increment(ProductPair, ["product_id", "related_id"], [(*pair, sign * count) for pair, count in pairs.items()], ["count"])
+    product_ids = {product_id for product_id, _ in pairs}
+    if sign < 0:
+        ProductPair.objects.filter(product_id__in=product_ids, count__lte=0).delete()
+    refresh_related(product_ids)
+
+
+def record_order(order, lines):
+    if is_counted(order.status):
+        apply_pairs(Counter(order_pairs(line.product_id for line in lines)))
+
+
+def record_status_change(orders, status):
+    # Вызывается до UPDATE, как и stats.apply_status_change
+    if is_counted(status):
+        apply_pairs(count_pairs(orders.filter(status__in=EXCLUDED_STATUSES)))
+    else:
+        apply_pairs(count_pairs(orders.exclude(status__in=EXCLUDED_STATUSES)), -1)
+
+
+def record_orders_delete(orders):
+    # Вызывается до DELETE, как и stats.apply_orders_delete
+    apply_pairs(count_pairs(orders.exclude(status__in=EXCLUDED_STATUSES)), -1)
+
+
+def top_neighbours(pairs):
+    neighbours = defaultdict(list)
+    for (product_id, related_id), count in pairs.items():
+        neighbours[product_id].append((count, -related_id))
+    for product_id, counts in neighbours.items():
+        for rank, (count, related_id) in enumerate(nlargest(TOP_K, counts), 1):
+            yield RelatedProduct(product_id=product_id, related_id=-related_id, count=count, rank=rank)
+
+
+def range_filter(lo, hi, prefix="product_id"):
+    scope = {}
+    if lo is not None:
+        scope[f"{prefix}__gte"] = lo
+    if hi is not None:
+        scope[f"{prefix}__lt"] = hi
+    return scope
+
+
+def count_range_pairs(lo, hi):
+    # Пары (продукт, сосед) с продуктом из [lo, hi): читаются только заказы, где такие продукты есть
+    orders = OrderProduct.objects.filter(**range_filter(lo, hi)).values("order_id")
+    lines = (
+        OrderProduct.objects.filter(order_id__in=orders)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    pairs, inside = Counter(), set()
+    for _, group in groupby(lines, key=lambda line: line[0]):
+        product_ids = sorted({product_id for _, product_id in group})
+        if len(product_ids) > MAX_ORDER_PRODUCTS:
+            continue
+        own = [product_id for product_id in product_ids
+               if (lo is None or product_id >= lo) and (hi is None or product_id < hi)]
+        inside.update(own)
+        pairs.update(product(own, product_ids))
+    for product_id in inside:
+        del pairs[(product_id, product_id)]
+    return pairs
+
+
+def rebuild_range(lo, hi):
+    with transaction.atomic():
+        RelatedProduct.objects.filter(**range_filter(lo, hi)).delete()
+        ProductPair.objects.filter(**range_filter(lo, hi)).delete()
+        pairs = count_range_pairs(lo, hi)
+        ProductPair.objects.bulk_create(
+            (ProductPair(product_id=product_id, related_id=related_id, count=count)
+             for (product_id, related_id), count in pairs.items()),
+            batch_size=BATCH_SIZE,
+        )
+        RelatedProduct.objects.bulk_create(top_neighbours(pairs), batch_size=BATCH_SIZE)
+    return len(pairs)
+
+
+def rebuild_related(range_size=REBUILD_RANGE_SIZE):
+    # Пока идет пересчет, у еще не пересчитанных продуктов остаются прежние соседи
+    bounds = list(Product.objects.order_by("id").values_list("id", flat=True)[::range_size])
+    bounds = [None, *bounds[1:], None]
+    return sum(rebuild_range(lo, hi) for lo, hi in zip(bounds, bounds[1:]))
@@ -0,0 +1,38 @@
+import re
+from django.db import connection
+
+
+# Полнотекстовый поиск продуктов по индексу FTS5 (ProductSearch).
+# Слова запроса ищутся по префиксу, результаты сортируются по релевантности (bm25).
+
+SEARCH_TABLE = "onlineStore_product_fts"
+
+WORD_RE = re.compile(r"\w+")
+
+
+def build_match_query(columns, text):
+    words = WORD_RE.findall(text)
+    if not words:
+        return None
+    terms = " AND ".join(f'"{word}"*' for word in words)
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+
+def search_products(queryset, title=None, description=None):
+    parts = []
+    for column, text in (("title", title), ("description", description)):
+        if text is not None:
+            query = build_match_query([column], text)
+            if query is None:
+                return queryset.none()
+            parts.append(query)
+    if not parts:
+        return queryset
+    return queryset.filter(search__document__match=" AND ".join(parts)).order_by("search__rank", "id")
+
+
+def rebuild_search_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{SEARCH_TABLE}"("{SEARCH_TABLE}") VALUES (\'rebuild\')')
+        cursor.execute(f'SELECT count(*) FROM "{SEARCH_TABLE}"')
+        return cursor.fetchone()[0]
@@ -0,0 +1,158 @@
+from django.contrib.auth.models import User, Group
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .auth import credential_cache
+from .permissions import permission_cache
+from .tokens import revoke_user_tokens, revoke_all_tokens
+from .cache import catalog_cache, orders_generation, user_generation
+from .metrics import record_query
+from .models import Category, Product, Order
+from .stats import refresh_category_stats, apply_orders_delete, apply_product_delete
+from .related import record_orders_delete
+from .price_index import price_index
+from .suggest import suggest_index
+
+
+# Пользователи и права
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_credentials(sender, instance, update_fields=None, **kwargs):
+    credential_cache.invalidate_user(instance.pk)
+    permission_cache.invalidate_user(instance.pk)
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        revoke_user_tokens(instance.pk)
+        # Пользователь вложен в ответы заказов (conditional.orders_version)
+        generation = user_generation(instance.pk)
+        transaction.on_commit(generation.bump)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_permissions(sender, instance, reverse, pk_set, **kwargs):
+    if not reverse:
+        credential_cache.invalidate_user(instance.pk)
+        permission_cache.invalidate_user(instance.pk)
+        revoke_user_tokens(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            credential_cache.invalidate_user(user_id)
+            permission_cache.invalidate_user(user_id)
+            revoke_user_tokens(user_id)
+    else:
+        credential_cache.clear()
+        permission_cache.clear()
+        revoke_all_tokens()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_delete, sender=Group)
+def invalidate_group_permissions(sender, **kwargs):
+    credential_cache.clear()
+    permission_cache.clear()
+    revoke_all_tokens()
+
+
+# Каталог
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_catalog_generation(sender, **kwargs):
+    # После коммита: иначе параллельный запрос успеет закэшировать под новым поколением строки до коммита
+    transaction.on_commit(catalog_cache.bump)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    # Для пересчета статистики старой категории и обновления индекса цен при изменении продукта.
+    # Загруженный из БД продукт помнит свои значения (Product.from_db), SELECT только для собранных вручную
+    if instance.pk is None:
+        return
+    old = getattr(instance, "_loaded_values", None)
+    if old is None:
+        old = Product.objects.filter(pk=instance.pk).values_list("category_id", "price").first()
+    instance._old_category_id, instance._old_price = old or (None, None)
+    instance._loaded_values = (instance.category_id, instance.price)
+
+
+@receiver(pre_delete, sender=Product)
+def subtract_product_revenue(sender, instance, **kwargs):
+    # Строки заказов удаляются каскадом, все pre_delete приходят до первого DELETE
+    apply_product_delete(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def schedule_category_stats(sender, instance, **kwargs):
+    # После коммита: при каскадном удалении категории ее строка статистики не должна создаваться заново
+    category_ids = {instance.category_id, getattr(instance, "_old_category_id", None)} - {None}
+    transaction.on_commit(lambda: refresh_category_stats(category_ids))
+
+
+@receiver(post_save, sender=Product)
+def update_price_index(sender, instance, **kwargs):
+    old_category_id = getattr(instance, "_old_category_id", None)
+    old = (old_category_id, instance._old_price) if old_category_id is not None else None
+    new = (instance.category_id, instance.price)
+    transaction.on_commit(lambda: price_index.move(instance.pk, old, new))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_price_index(sender, instance, **kwargs):
+    id, category_id, price = instance.pk, instance.category_id, instance.price
+    transaction.on_commit(lambda: price_index.remove(id, category_id, price))
+
+
+@receiver(post_save, sender=Product)
+def update_suggest_index(sender, instance, **kwargs):
+    id, title = instance.pk, instance.title
+    transaction.on_commit(lambda: suggest_index.update(id, title))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    id = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove(id))
+
+
+# Заказы
+
+
+@receiver(pre_delete, sender=Order)
+def subtract_order_revenue(sender, instance, **kwargs):
+    # Удаление из админки или каскадом от пользователя: api заказы не удаляет
+    orders = Order.objects.filter(pk=instance.pk)
+    apply_orders_delete(orders)
+    record_orders_delete(orders)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_orders_generation(sender, instance, **kwargs):
+    # После коммита, как и поколение каталога: иначе ответ со старыми заказами уйдет под новым ETag
+    transaction.on_commit(orders_generation(instance.user_id).bump)
+
+
+# База данных
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
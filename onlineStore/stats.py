@@ -0,0 +1,148 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Category, Product, Order, OrderProduct, DailyRevenue, CategoryRevenue, ProductRevenue, CategoryStats
+
+
+# Предрассчитанная статистика продаж и каталога.
+# Выручка меняется приращениями при создании заказа, смене статуса и удалении заказа или продукта,
+# статистика каталога пересчитывается для затронутых категорий.
+# rebuild_stats() пересчитывает все с нуля.
+
+EXCLUDED_STATUSES = set(getattr(settings, "STATS_EXCLUDED_STATUSES", ["Отменен"]))
+
+
+def is_counted(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def increment(model, key_columns, rows, fields):
+    # INSERT ... ON CONFLICT DO UPDATE с прибавлением к существующим значениям
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys = ", ".join(quote(column) for column in key_columns)
+    columns = ", ".join(quote(column) for column in [*key_columns, *fields])
+    placeholders = ", ".join(["%s"] * (len(key_columns) + len(fields)))
+    updates = ", ".join(f"{quote(field)} = {table}.{quote(field)} + excluded.{quote(field)}" for field in fields)
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class RevenueDelta:
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, 0, 0])
+        self.categories = defaultdict(lambda: [0, 0])
+        self.products = defaultdict(lambda: [0, 0])
+
+    def add_orders(self, day, count):
+        self.days[day][1] += count
+
+    def add_lines(self, day, category_id, product_id, revenue, items):
+        self.days[day][0] += revenue
+        self.days[day][2] += items
+        self.categories[category_id][0] += revenue
+        self.categories[category_id][1] += items
+        self.products[product_id][0] += revenue
+        self.products[product_id][1] += items
+
+    def apply(self, sign=1):
+        def rows(deltas):
+            return [(key, *(sign * value for value in values)) for key, values in deltas.items()]
+
+        increment(DailyRevenue, ["date"], rows(self.days), ["revenue", "orders", "items"])
+        increment(CategoryRevenue, ["category_id"], rows(self.categories), ["revenue", "items"])
+        increment(ProductRevenue, ["product_id"], rows(self.products), ["revenue", "items"])
+
+
+def apply_new_order(order, lines):
+    if not is_counted(order.status):
+        return
+    day = timezone.localdate(order.datetime)
+    delta = RevenueDelta()
+    delta.add_orders(day, 1)
+    for line in lines:
+        delta.add_lines(day, line.product.category_id, line.product_id, line.count * line.price, line.count)
+    delta.apply()
+
+
+def lines_delta(lines, delta):
+    lines = (
+        lines.values("product_id", "product__category_id", day=TruncDate("order__datetime"))
+        .annotate(revenue=Sum(F("count") * F("price")), items=Sum("count"))
+    )
+    for row in lines:
+        delta.add_lines(row["day"], row["product__category_id"], row["product_id"], row["revenue"], row["items"])
+    return delta
+
+
+def orders_delta(orders):
+    delta = RevenueDelta()
+    for row in orders.values(day=TruncDate("datetime")).annotate(count=Count("id")):
+        delta.add_orders(row["day"], row["count"])
+    return lines_delta(OrderProduct.objects.filter(order__in=orders), delta)
+
+
+def apply_status_change(orders, status):
+    # Вызывается до UPDATE: учитывает только заказы, которые переходят между учитываемыми и исключенными статусами
+    if is_counted(status):
+        orders_delta(orders.filter(status__in=EXCLUDED_STATUSES)).apply()
+    else:
+        orders_delta(orders.exclude(status__in=EXCLUDED_STATUSES)).apply(-1)
+
+
+def apply_orders_delete(orders):
+    # Вызывается до DELETE (pre_delete), пока строки заказов еще в базе
+    orders_delta(orders.exclude(status__in=EXCLUDED_STATUSES)).apply(-1)
+
+
+def apply_product_delete(product_id):
+    # Удаление продукта каскадом удаляет его строки в заказах: их выручка уходит из дней и категории.
+    # Строку ProductRevenue удаляет тот же каскад
+    lines = OrderProduct.objects.filter(product_id=product_id).exclude(order__status__in=EXCLUDED_STATUSES)
+    delta = lines_delta(lines, RevenueDelta())
+    delta.products.clear()
+    delta.apply(-1)
+
+
+def refresh_category_stats(category_ids):
+    category_ids = set(Category.objects.filter(id__in=category_ids).values_list("id", flat=True))
+    if not category_ids:
+        return
+    aggregates = {
+        row["category_id"]: row
+        for row in Product.objects.filter(category_id__in=category_ids).values("category_id").annotate(
+            product_count=Count("id"), price_min=Min("price"), price_max=Max("price"), price_avg=Avg("price")
+        )
+    }
+    CategoryStats.objects.bulk_create(
+        [
+            CategoryStats(
+                category_id=category_id,
+                product_count=aggregates.get(category_id, {}).get("product_count", 0),
+                price_min=aggregates.get(category_id, {}).get("price_min"),
+                price_max=aggregates.get(category_id, {}).get("price_max"),
+                price_avg=aggregates.get(category_id, {}).get("price_avg"),
+            )
+            for category_id in category_ids
+        ],
+        update_conflicts=True,
+        unique_fields=["category"],
+        update_fields=["product_count", "price_min", "price_max", "price_avg"],
+    )
+
+
+def rebuild_stats():
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        CategoryRevenue.objects.all().delete()
+        ProductRevenue.objects.all().delete()
+        CategoryStats.objects.all().delete()
+        orders_delta(Order.objects.exclude(status__in=EXCLUDED_STATUSES)).apply()
+        refresh_category_stats(Category.objects.values_list("id", flat=True))
@@ -0,0 +1,293 @@
+import threading
+import time
+from array import array
+from heapq import heappop, heappush
+from django.conf import settings
+from django.db import connection
+from .models import Product, ProductRevenue
+
+
+# Подсказки по началу слов в названиях продуктов.
+# Основа - отсортированный массив ключей (хвосты свернутого названия от начала каждого слова),
+# поэтому все ключи с заданным префиксом лежат подряд и находятся двоичным поиском, как поддерево в trie.
+# Ключи не хранятся строками: свернутые названия лежат подряд в одном буфере UTF-8, ключ - смещение
+# начала слова в нем, конец ключа - конец его названия. Порядок байтов UTF-8 совпадает с порядком символов.
+# Исходные названия так же лежат в одном буфере, поэтому stats()["bytes"] - почти вся память основы.
+# Поверх популярности ключей построено дерево отрезков: лучшие N в диапазоне достаются
+# по очереди через кучу за O(N log n) без просмотра всего диапазона.
+# Популярность - число проданных штук из ProductRevenue.
+# Изменения продуктов копятся в небольшой дельте и списке удаленных до перестроения основы:
+# перестроение идет в фоне при MAX_PENDING изменениях или через MAX_AGE секунд.
+# Основа тоже строится в фоне при первом обращении и после invalidate(), до готовности подсказки пустые.
+
+_config = getattr(settings, "PRODUCT_SUGGEST", {})
+
+MAX_AGE = _config.get("MAX_AGE", 3600)
+MAX_PENDING = _config.get("MAX_PENDING", 500)
+DEFAULT_LIMIT = _config.get("DEFAULT_LIMIT", 10)
+MAX_LIMIT = _config.get("MAX_LIMIT", 50)
+
+MAX_CANDIDATES_FACTOR = 20
+
+
+def fold(text):
+    # Регистр сворачивается casefold, "ё" считается "е", пробелы схлопываются
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+def word_keys(folded):
+    keys = [folded]
+    for position, char in enumerate(folded):
+        if char == " ":
+            keys.append(folded[position + 1:])
+    return keys
+
+
+class TitleTable:
+    def __init__(self, rows):
+        # rows - (id, название, популярность)
+        self.ids = array("q")
+        self.scores = array("q")
+        self.title_ends = array("q")
+        self.folded_ends = array("q")
+        titles, folded = bytearray(), bytearray()
+        entries = []
+        for id, title, score in rows:
+            product = len(self.ids)
+            self.ids.append(id)
+            self.scores.append(score or 0)
+            titles += title.encode("utf-8")
+            self.title_ends.append(len(titles))
+            start, key = len(folded), fold(title).encode("utf-8")
+            folded += key
+            self.folded_ends.append(len(folded))
+            # Пробел в UTF-8 - один байт, который не встречается внутри других символов
+            entries.append((key, start, product))
+            entries.extend((key[position + 1:], start + position + 1, product)
+                           for position, byte in enumerate(key) if byte == 32)
+        entries.sort()
+        self.titles = bytes(titles)
+        self.folded = bytes(folded)
+        self.offsets = array("q", (offset for _, offset, _ in entries))
+        self.products = array("i", (product for _, _, product in entries))
+        del entries
+        self.entry_scores = array("q", (self.scores[product] for product in self.products))
+        self.tree = self.build_tree()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def title(self, product):
+        start = self.title_ends[product - 1] if product else 0
+        return self.titles[start:self.title_ends[product]].decode("utf-8")
+
+    def key_prefix(self, index, length):
+        start = self.offsets[index]
+        return self.folded[start:min(start + length, self.folded_ends[self.products[index]])]
+
+    def prefix_range(self, prefix):
+        # [lo, hi) ключей, начинающихся с prefix (bytes)
+        length = len(prefix)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.key_prefix(middle, length) < prefix:
+                lo = middle + 1
+            else:
+                hi = middle
+        start, hi = lo, len(self)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.key_prefix(middle, length) == prefix:
+                lo = middle + 1
+            else:
+                hi = middle
+        return start, lo
+
+    def build_tree(self):
+        # Дерево отрезков снизу вверх: в узле индекс ключа с наибольшей популярностью, при равенстве - меньший
+        size = len(self)
+        scores = self.entry_scores
+        tree = array("i", bytes(4 * size)) + array("i", range(size))
+        for node in range(size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = left if scores[left] > scores[right] or (scores[left] == scores[right] and left < right) else right
+        return tree
+
+    def argmax(self, lo, hi):
+        tree, scores, size = self.tree, self.entry_scores, len(self)
+        best = -1
+        lo += size
+        hi += size
+        while lo < hi:
+            if lo & 1:
+                index = tree[lo]
+                if best < 0 or scores[index] > scores[best] or (scores[index] == scores[best] and index < best):
+                    best = index
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                index = tree[hi]
+                if best < 0 or scores[index] > scores[best] or (scores[index] == scores[best] and index < best):
+                    best = index
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def top(self, prefix):
+        # Индексы продуктов по убыванию популярности среди ключей с префиксом (продукт может повторяться)
+        heap = []
+
+        def push(lo, hi):
+            if lo < hi:
+                index = self.argmax(lo, hi)
+                heappush(heap, (-self.entry_scores[index], index, lo, hi))
+
+        push(*self.prefix_range(prefix.encode("utf-8")))
+        while heap:
+            _, index, lo, hi = heappop(heap)
+            yield self.products[index]
+            push(lo, index)
+            push(index + 1, hi)
+
+    def nbytes(self):
+        arrays = (self.ids, self.scores, self.title_ends, self.folded_ends, self.offsets, self.products, self.entry_scores, self.tree)
+        return sum(values.itemsize * len(values) for values in arrays) + len(self.titles) + len(self.folded)
+
+
+def product_score(product_id):
+    return ProductRevenue.objects.filter(product_id=product_id).values_list("items", flat=True).first() or 0
+
+
+def load_rows():
+    return Product.objects.order_by("id").values_list("id", "title", "revenue__items").iterator(chunk_size=10_000)
+
+
+class SuggestIndex:
+    def __init__(self, max_age=3600, max_pending=500):
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self._table = None
+        self._built_at = None
+        self._delta = {}
+        self._removed = {}
+        self._sequence = 0
+        self._epoch = 0
+        self._builds = 0
+        self._rebuilding = False
+        self._lock = threading.RLock()
+
+    def rebuild(self, rows=None):
+        with self._lock:
+            sequence, epoch = self._sequence, self._epoch
+            self._builds += 1
+        try:
+            table = TitleTable(load_rows() if rows is None else rows)
+        finally:
+            with self._lock:
+                self._builds -= 1
+        with self._lock:
+            # После invalidate() снимок мог быть прочитан до массового изменения: он не ставится
+            if epoch != self._epoch:
+                return
+            # Изменения, закоммиченные до чтения снимка, уже в основе; более поздние остаются в дельте
+            self._table = table
+            self._built_at = time.monotonic()
+            self._delta = {id: entry for id, entry in self._delta.items() if entry[3] > sequence}
+            self._removed = {id: seq for id, seq in self._removed.items() if seq > sequence}
+
+    def rebuild_in_background(self):
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self._rebuilding = False
+                connection.close()
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def ensure(self):
+        with self._lock:
+            missing = self._table is None
+            stale = not missing and time.monotonic() - self._built_at > self.max_age
+            pending = len(self._delta) + len(self._removed) > self.max_pending
+        if missing or stale or pending:
+            self.rebuild_in_background()
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+            self._delta = {}
+            self._removed = {}
+            self._epoch += 1
+
+    def _tracking(self):
+        # Без основы изменения нужны только идущему построению: оно могло прочитать снимок до них
+        return self._table is not None or self._builds > 0
+
+    def update(self, id, title, score=None):
+        if not self._tracking():
+            return
+        if score is None:
+            score = product_score(id)
+        with self._lock:
+            self._sequence += 1
+            self._delta[id] = (tuple(word_keys(fold(title))), title, score, self._sequence)
+            self._removed[id] = self._sequence
+
+    def remove(self, id):
+        with self._lock:
+            if not self._tracking():
+                return
+            self._sequence += 1
+            self._delta.pop(id, None)
+            self._removed[id] = self._sequence
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        prefix = fold(query)
+        if not prefix:
+            return []
+        self.ensure()
+        with self._lock:
+            table, delta, removed = self._table, self._delta, self._removed
+            candidates = [
+                (-score, id, title)
+                for id, (keys, title, score, _) in delta.items()
+                if any(key.startswith(prefix) for key in keys)
+            ]
+            titles = set()
+            for steps, product in enumerate(table.top(prefix) if table is not None else ()):
+                if len(titles) >= limit or steps >= limit * MAX_CANDIDATES_FACTOR:
+                    break
+                id, title = table.ids[product], table.title(product)
+                if id in removed or title in titles:
+                    continue
+                titles.add(title)
+                candidates.append((-table.scores[product], id, title))
+        # Одинаковые после свертки названия показываются один раз, у самого популярного продукта
+        candidates.sort(key=lambda candidate: (candidate[0], fold(candidate[2]), candidate[1]))
+        result, folded = [], set()
+        for _, id, title in candidates:
+            if fold(title) in folded:
+                continue
+            folded.add(fold(title))
+            result.append({"id": id, "title": title})
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "built": self._table is not None,
+                "keys": len(self._table) if self._table is not None else 0,
+                "bytes": self._table.nbytes() if self._table is not None else 0,
+                "pending": len(self._delta) + len(self._removed),
+            }
+
+
+suggest_index = SuggestIndex(max_age=MAX_AGE, max_pending=MAX_PENDING)
@@ -1,8 +1,32 @@
+import csv
+import gzip
+import json
+import threading
+import time
 from base64 import b64encode
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client
-from django.contrib.auth.models import User, Permission
-from .models import Category, Product, WishList, Order, OrderProduct
-from .api import CategoryIn, ProductIn, UserRegistration, WishListIn
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.contrib.auth.models import User, Group, Permission
+from .models import Category, Product, WishList, Order, OrderProduct, DailyRevenue, CategoryRevenue, ProductRevenue, CategoryStats, ProductPair, RelatedProduct, AuthGeneration, CacheGeneration
+from ninja.responses import NinjaJSONEncoder
+from .api import CategoryIn, ProductIn, ProductOut, UserRegistration, WishListIn, WishListOut, OrderOut
+from .auth import credential_cache
+from .permissions import permission_cache
+from .tokens import generation_cache, issue_tokens
+from .cache import catalog_cache, generation_values, orders_generation
+from .price_index import price_index
+from .renderers import render_rows
+from .suggest import TitleTable, suggest_index
+from .metrics import registry
+from .stats import refresh_category_stats
+from .related import rebuild_related
 
 
 def get_http_authorization(username, password):
@@ -13,6 +37,15 @@ def get_http_authorization(username, password):
 class APITest(TestCase):
     def setUp(self):
         self.client = Client()
+        credential_cache.clear()
+        credential_cache.reset_stats()
+        catalog_cache.clear()
+        catalog_cache.reset_stats()
+        permission_cache.clear()
+        permission_cache.reset_stats()
+        generation_cache.clear()
+        price_index.invalidate()
+        suggest_index.invalidate()
 
         self.user = User.objects.create_user(
             username="testuser", 
@@ -25,6 +58,7 @@ class APITest(TestCase):
         
         self.user_auth = get_http_authorization("testuser", "user1234")
         self.admin_auth = get_http_authorization("testadmin", "admin1234")
+        self.user_headers = {"Authorization": self.user_auth["HTTP_AUTHORIZATION"]}
 
         self.category = Category.objects.create(
             title="Тестовая категория",
@@ -202,4 +236,914 @@ class APITest(TestCase):
     def test_put_order_status_admin(self):
         response = self.client.put(f"/api/order/{self.order.id}/status/В обработке", **self.admin_auth)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["message"], "Статус успешно изменен")
\ No newline at end of file
+        self.assertEqual(response.json()["message"], "Статус успешно изменен")
+
+    def test_credential_cache_hit(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        response = self.client.get("/api/auth/check", **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(credential_cache.stats()["hits"], 1)
+        self.assertEqual(credential_cache.stats()["misses"], 1)
+
+    def test_credential_cache_wrong_password(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        response = self.client.get("/api/auth/check", **get_http_authorization("testuser", "wrong"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_credential_cache_password_change(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        self.user.set_password("new1234")
+        self.user.save()
+        response = self.client.get("/api/auth/check", **self.user_auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_credential_cache_change_in_other_process(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        # Другой процесс меняет пароль: его сигналы сбрасывают только свой кэш, но увеличивают поколение в БД
+        with mock.patch("onlineStore.signals.credential_cache"), mock.patch("onlineStore.signals.permission_cache"):
+            self.user.set_password("new1234")
+            self.user.save()
+        self.assertEqual(credential_cache.stats()["size"], 1)
+        generation_cache.clear()
+        response = self.client.get("/api/auth/check", **self.user_auth)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(credential_cache.stats()["size"], 0)
+
+    def test_credential_cache_deactivated(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get("/api/auth/check", **self.user_auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_credential_cache_permission_change(self):
+        response = self.client.get("/api/users", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+        self.user.user_permissions.add(Permission.objects.get(codename="view_user"))
+        response = self.client.get("/api/users", **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_products_pagination(self):
+        for i in range(4):
+            Product.objects.create(title=f"Продукт {i}", category=self.category, price=100, description="")
+        response = self.client.get("/api/products?limit=3")
+        self.assertEqual(len(response.json()), 3)
+        cursor = response["X-Next-Cursor"]
+        response = self.client.get(f"/api/products?limit=3&cursor={cursor}")
+        self.assertEqual(len(response.json()), 2)
+        self.assertFalse(response.has_header("X-Next-Cursor"))
+
+    def test_get_products_bad_cursor(self):
+        response = self.client.get("/api/products?cursor=broken")
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_products_stream(self):
+        Product.objects.create(title="Второй продукт", category=self.category, price=100, description="")
+        response = self.client.get("/api/products?stream=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Тестовый продукт", lines[0])
+
+    def test_get_products_filter_search_ranked(self):
+        Product.objects.create(title="Стол", category=self.category, price=100, description="Стол тестовый тестовый")
+        response = self.client.get("/api/products/filter?title=тест")
+        self.assertEqual([p["title"] for p in response.json()], ["Тестовый продукт"])
+        response = self.client.get("/api/products/filter?description=тест")
+        self.assertEqual([p["title"] for p in response.json()], ["Стол", "Тестовый продукт"])
+
+    def test_get_products_filter_search_sync(self):
+        self.product.title = "Кресло"
+        self.product.save()
+        self.assertEqual(len(self.client.get("/api/products/filter?title=Тест").json()), 0)
+        self.assertEqual(len(self.client.get("/api/products/filter?title=крес").json()), 1)
+        self.product.delete()
+        self.assertEqual(len(self.client.get("/api/products/filter?title=крес").json()), 0)
+
+    def post_order_queries(self, lines):
+        for i in range(lines):
+            product = Product.objects.create(title=f"Продукт {i}", category=self.category, price=10, description="")
+            WishList.objects.create(user=self.user, product=product, count=2)
+        self.client.get("/api/auth/check", **self.user_auth)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/order", **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_post_order_constant_queries(self):
+        small = self.post_order_queries(1)
+        WishList.objects.all().delete()
+        self.assertEqual(self.post_order_queries(20), small)
+
+    def test_post_order_total_from_captured_price(self):
+        WishList.objects.filter(id=self.wishlist_item.id).update(count=3)
+        self.client.post("/api/order", **self.user_auth)
+        order = Order.objects.exclude(id=self.order.id).get()
+        self.product.price = 5
+        self.product.save()
+        self.assertEqual(order.total, 3000)
+        self.assertEqual(order.get_total_sum(), 3000)
+        self.assertFalse(WishList.objects.filter(user=self.user).exists())
+
+    def test_post_order_empty(self):
+        WishList.objects.all().delete()
+        response = self.client.post("/api/order", **self.user_auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_catalog_cache_hit(self):
+        self.client.get(f"/api/product/{self.product.id}")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/product/{self.product.id}")
+        self.assertEqual(response.json()["title"], "Тестовый продукт")
+        self.assertEqual(catalog_cache.stats()["local_hits"], 1)
+
+    def test_catalog_cache_invalidation(self):
+        self.client.get(f"/api/category/{self.category.slug}/products/")
+        generation = catalog_cache.generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title="Новый продукт", category=self.category, price=10, description="")
+            self.assertEqual(catalog_cache.generation(), generation)
+        response = self.client.get(f"/api/category/{self.category.slug}/products/")
+        self.assertEqual(len(response.json()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.title = "Новое название"
+            self.category.save()
+        response = self.client.get(f"/api/category/{self.category.slug}")
+        self.assertEqual(response.json()["title"], "Новое название")
+
+    def test_catalog_cache_single_flight(self):
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        results = []
+        # Поколение читается здесь: другие потоки не видят незакоммиченных строк тестовой транзакции
+        catalog_cache.generation()
+        threads = [threading.Thread(target=lambda: results.append(catalog_cache.get_or_set(("single-flight",), producer)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+
+    def test_get_products_not_modified(self):
+        response = self.client.get("/api/products")
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title="Новый продукт", category=self.category, price=10, description="")
+        response = self.client.get("/api/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_get_categories_if_modified_since(self):
+        response = self.client.get("/api/categories")
+        response = self.client.get("/api/categories", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_generation_shared_between_processes(self):
+        etag = self.client.get("/api/products")["ETag"]
+        # Другой процесс меняет каталог: в этом процессе остается только прочитанное поколение
+        CacheGeneration.objects.filter(key="catalog").update(value=F("value") + 1)
+        Product.objects.filter(id=self.product.id).update(title="Изменен в другом процессе")
+        self.assertEqual(self.client.get("/api/products", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        generation_values.clear()
+        response = self.client.get("/api/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["title"], "Изменен в другом процессе")
+
+    def test_get_orders_not_modified(self):
+        etag = self.client.get("/api/orders", **self.user_auth)["ETag"]
+        response = self.client.get("/api/orders", HTTP_IF_NONE_MATCH=etag, **self.user_auth)
+        self.assertEqual(response.status_code, 304)
+        generation = orders_generation(self.user.id).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/order", **self.user_auth)
+            self.assertEqual(orders_generation(self.user.id).get(), generation)
+        self.assertNotEqual(orders_generation(self.user.id).get(), generation)
+        response = self.client.get("/api/orders", HTTP_IF_NONE_MATCH=etag, **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_get_order_not_modified_after_product_and_user_change(self):
+        url = f"/api/order/{self.order.id}"
+        etag = self.client.get(url, **self.user_auth)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "Новое название"
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["product"]["title"], "Новое название")
+        etag = self.client.get("/api/orders", **self.user_auth)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Иван"
+            self.user.save()
+        response = self.client.get("/api/orders", HTTP_IF_NONE_MATCH=etag, **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["user"]["first_name"], "Иван")
+
+    async def test_async_get_products(self):
+        response = await self.async_client.get("/api/async/products")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["title"], "Тестовый продукт")
+
+    async def test_async_catalog_cache_and_etag(self):
+        response = await self.async_client.get(f"/api/async/product/{self.product.id}")
+        self.assertEqual(response.json()["title"], "Тестовый продукт")
+        self.assertEqual(response["ETag"], self.client.get(f"/api/product/{self.product.id}")["ETag"])
+        self.assertEqual(catalog_cache.stats()["local_hits"], 1)
+        response = await self.async_client.get("/api/async/products", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        other = await Category.objects.acreate(title="Другая", slug="other")
+        with mock.patch("onlineStore.pagination.STREAM_CHUNK_SIZE", 1):
+            response = await self.async_client.get("/api/async/categories?stream=true")
+            lines = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual([line["id"] for line in lines], [self.category.id, other.id])
+        response = await self.async_client.get(f"/api/async/category/{self.category.slug}/products/?fields=price")
+        self.assertEqual(response.json(), [{"id": self.product.id, "price": 1000}])
+
+    async def test_async_get_wishlist(self):
+        response = await self.async_client.get("/api/async/wishlist", headers=self.user_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    async def test_async_wishlist_and_order(self):
+        payload = WishListIn(product_id=self.product.id, count=2).dict()
+        response = await self.async_client.post("/api/async/wishlist/product", data=payload, content_type="application/json", headers=self.user_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await WishList.objects.aget(id=self.wishlist_item.id)).count, 3)
+        response = await self.async_client.post("/api/async/order", headers=self.user_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Order.objects.filter(user=self.user).acount(), 2)
+        self.assertFalse(await WishList.objects.filter(user=self.user).aexists())
+
+    async def test_async_auth_wrong_password(self):
+        response = await self.async_client.get("/api/async/orders", headers={"Authorization": get_http_authorization("testuser", "wrong")["HTTP_AUTHORIZATION"]})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_token_auth_cold_generations(self):
+        tokens = await sync_to_async(issue_tokens)(self.user)
+        generation_cache.clear()
+        response = await self.async_client.get("/api/async/wishlist", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["id"], self.wishlist_item.id)
+
+    def test_wishlist_unique_user_product(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            WishList.objects.create(user=self.user, product=self.product, count=1)
+
+    def test_explain_queries_no_full_scan(self):
+        call_command("explain_queries", fail_on_scan=True, stdout=StringIO())
+
+    def test_post_wishlist_product_increments(self):
+        payload = WishListIn(product_id=self.product.id, count=2).dict()
+        self.client.get("/api/auth/check", **self.user_auth)
+        with self.assertNumQueries(1):
+            self.client.post("/api/wishlist/product", data=payload, content_type="application/json", **self.user_auth)
+        self.wishlist_item.refresh_from_db()
+        self.assertEqual(self.wishlist_item.count, 3)
+
+    def test_post_wishlist_product_not_found(self):
+        payload = WishListIn(product_id=0, count=1).dict()
+        response = self.client.post("/api/wishlist/product", data=payload, content_type="application/json", **self.user_auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_wishlist_batch(self):
+        product = Product.objects.create(title="Второй продукт", category=self.category, price=10, description="")
+        payload = [
+            WishListIn(product_id=product.id, count=2).dict(),
+            WishListIn(product_id=product.id, count=1).dict(),
+            WishListIn(product_id=self.product.id, count=-1).dict(),
+        ]
+        response = self.client.post("/api/wishlist/batch", data=payload, content_type="application/json", **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["removed"], 1)
+        self.assertEqual(list(WishList.objects.filter(user=self.user).values_list("product_id", "count")), [(product.id, 3)])
+
+    def test_post_wishlist_batch_missing_product(self):
+        payload = [WishListIn(product_id=self.product.id, count=1).dict(), WishListIn(product_id=0, count=1).dict()]
+        response = self.client.post("/api/wishlist/batch", data=payload, content_type="application/json", **self.user_auth)
+        self.assertEqual(response.status_code, 404)
+        self.wishlist_item.refresh_from_db()
+        self.assertEqual(self.wishlist_item.count, 1)
+
+    def test_delete_wishlist_single_query(self):
+        self.client.get("/api/auth/check", **self.user_auth)
+        with self.assertNumQueries(1):
+            self.client.delete("/api/wishlist", **self.user_auth)
+        self.assertFalse(WishList.objects.filter(user=self.user).exists())
+
+    def test_put_orders_status_admin(self):
+        other = Order.objects.create(user=self.user, status="Отменен", total=0)
+        payload = {"status": "Отправлен", "current_status": "Новый"}
+        response = self.client.put("/api/orders/status", data=payload, content_type="application/json", **self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["updated"], 1)
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.order.status, "Отправлен")
+        self.assertEqual(other.status, "Отменен")
+
+    def test_put_orders_status_by_ids(self):
+        payload = {"status": "Отправлен", "ids": [self.order.id]}
+        response = self.client.put("/api/orders/status", data=payload, content_type="application/json", **self.admin_auth)
+        self.assertEqual(response.json()["updated"], 1)
+
+    def test_put_orders_status_no_filter(self):
+        payload = {"status": "Отправлен"}
+        response = self.client.put("/api/orders/status", data=payload, content_type="application/json", **self.admin_auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_put_orders_status_no_permission(self):
+        payload = {"status": "Отправлен", "ids": [self.order.id]}
+        response = self.client.put("/api/orders/status", data=payload, content_type="application/json", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_get_metrics_admin(self):
+        registry.clear()
+        self.client.get("/api/products")
+        response = self.client.get("/api/metrics", **self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode("utf-8")
+        self.assertIn('api_requests_total{operation="GET api/products",status="200"} 1', text)
+        self.assertIn('api_db_queries_count{operation="GET api/products"} 1', text)
+        self.assertIn('api_serialization_duration_seconds_count{operation="GET api/products"} 1', text)
+        self.assertIn("api_credential_cache_hits", text)
+        self.assertIn("api_suggest_index_bytes", text)
+
+    def test_metrics_unmatched_path(self):
+        registry.clear()
+        self.client.get("/api/no-such-path-1")
+        self.client.get("/api/no-such-path-2")
+        text = self.client.get("/api/metrics", **self.admin_auth).content.decode("utf-8")
+        self.assertIn('api_requests_total{operation="GET <unmatched>",status="404"} 2', text)
+        self.assertNotIn("no-such-path", text)
+
+    async def test_metrics_async_request(self):
+        registry.clear()
+        await self.async_client.get("/api/async/products")
+        text = registry.render()
+        self.assertIn('api_requests_total{operation="GET api/async/products",status="200"} 1', text)
+        self.assertIn('api_db_queries_count{operation="GET api/async/products"}', text)
+
+    def test_metrics_fast_path_serialization(self):
+        registry.clear()
+
+        def slow_dumps(data):
+            time.sleep(0.05)
+            return b"[]"
+
+        with mock.patch("onlineStore.renderers.dumps", slow_dumps):
+            self.client.get("/api/wishlist?fast=true", **self.user_auth)
+        text = self.client.get("/api/metrics", **self.admin_auth).content.decode("utf-8")
+        line = next(line for line in text.splitlines() if line.startswith('api_serialization_duration_seconds_sum{operation="GET api/wishlist"}'))
+        self.assertGreaterEqual(float(line.rsplit(" ", 1)[1]), 0.05)
+
+    def test_get_metrics_no_permission(self):
+        response = self.client.get("/api/metrics", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_slow_request_log(self):
+        with mock.patch("onlineStore.metrics.SLOW_REQUEST_SECONDS", 0), self.assertLogs("onlineStore.metrics") as logs:
+            self.client.get(f"/api/product/{self.product.id}")
+        self.assertIn("onlineStore_product", logs.output[0])
+
+    def test_generate_data(self):
+        call_command("generate_data", products=50, categories=3, users=2, prefix="gen", stdout=StringIO())
+        self.assertEqual(Product.objects.filter(category__slug__startswith="gen-").count(), 50)
+        self.assertEqual(WishList.objects.filter(user__username__startswith="gen-").count(), 6)
+        order = Order.objects.filter(user__username="gen-user-0").first()
+        self.assertEqual(order.total, order.get_total_sum())
+        titles = list(Product.objects.filter(category__slug__startswith="gen-").order_by("id").values_list("title", flat=True))
+        Product.objects.filter(category__slug__startswith="gen-").delete()
+        call_command("generate_data", products=50, categories=3, users=2, prefix="gen2", stdout=StringIO())
+        self.assertEqual(titles, list(Product.objects.filter(category__slug__startswith="gen2-").order_by("id").values_list("title", flat=True)))
+
+    def test_post_products_import_ndjson(self):
+        lines = [
+            {"title": "Диван", "category": "mebel", "category_title": "Мебель", "price": 500},
+            {"id": self.product.id, "title": "Обновленный продукт", "category": self.category.slug, "price": 1200},
+            {"title": "Без цены", "category": "mebel"},
+        ]
+        content = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\nне json\n"
+        upload = SimpleUploadedFile("feed.ndjson", content.encode("utf-8"))
+        response = self.client.post("/api/products/import", data={"file": upload}, **self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result["imported"], result["categories_created"], result["error_count"]), (2, 1, 2))
+        self.assertEqual([error["line"] for error in result["errors"]], [3, 4])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.price), ("Обновленный продукт", 1200))
+        self.assertEqual(Category.objects.get(slug="mebel").title, "Мебель")
+        self.assertEqual(len(self.client.get("/api/products/filter?title=диван").json()), 1)
+
+    def test_post_products_import_csv(self):
+        content = "title,category,price,description\nКомод,test-category,300,Белый\nШкаф,test-category,дорого,\n"
+        upload = SimpleUploadedFile("feed.csv", content.encode("utf-8"))
+        response = self.client.post("/api/products/import", data={"file": upload}, **self.admin_auth)
+        self.assertEqual(response.json()["imported"], 1)
+        self.assertEqual(response.json()["errors"][0]["line"], 3)
+        self.assertTrue(Product.objects.filter(title="Комод", category=self.category).exists())
+
+    def test_post_products_import_csv_ragged_row(self):
+        content = "title,category,price\nКомод,test-category,300,лишнее\nШкаф,test-category\nТумба,test-category,200\n"
+        upload = SimpleUploadedFile("feed.csv", content.encode("utf-8"))
+        response = self.client.post("/api/products/import", data={"file": upload}, **self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result["rows"], result["imported"]), (3, 1))
+        self.assertEqual([error["line"] for error in result["errors"]], [2, 3])
+        self.assertIn("столбцов", result["errors"][0]["error"])
+        self.assertFalse(Product.objects.filter(title="Комод").exists())
+
+    def test_post_products_import_no_permission(self):
+        upload = SimpleUploadedFile("feed.ndjson", b"")
+        response = self.client.post("/api/products/import", data={"file": upload}, **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_get_orders_export_csv(self):
+        Order.objects.create(user=self.user, status="Отменен", total=0)
+        response = self.client.get("/api/orders/export?status=Новый", **self.admin_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(b"".join(response.streaming_content).decode("utf-8").splitlines()))
+        self.assertEqual(rows[0][0], "order_id")
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][5:], ["testuser", str(self.product.id), "Тестовый продукт", "1", "1000", "1000"])
+
+    def test_get_orders_export_ndjson(self):
+        response = self.client.get("/api/orders/export?format=ndjson&date_to=2000-01-01T00:00:00Z", **self.admin_auth)
+        self.assertEqual(b"".join(response.streaming_content), b"")
+        response = self.client.get("/api/orders/export?format=ndjson&date_from=2000-01-01T00:00:00Z", **self.admin_auth)
+        line = json.loads(b"".join(response.streaming_content))
+        self.assertEqual((line["order_id"], line["username"], line["sum"]), (self.order.id, "testuser", 1000))
+
+    def test_get_orders_export_no_permission(self):
+        response = self.client.get("/api/orders/export", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_stats_follow_orders(self):
+        WishList.objects.filter(id=self.wishlist_item.id).update(count=3)
+        self.client.post("/api/order", **self.user_auth)
+        order = Order.objects.latest("id")
+        response = self.client.get("/api/stats/revenue/daily", **self.admin_auth)
+        self.assertEqual([(day["revenue"], day["orders"], day["items"]) for day in response.json()], [(3000, 1, 3)])
+        self.assertEqual(self.client.get(f"/api/stats/revenue/product/{self.product.id}", **self.admin_auth).json()["revenue"], 3000)
+
+        self.client.put(f"/api/order/{order.id}/status/Отменен", **self.admin_auth)
+        self.client.put(f"/api/order/{order.id}/status/Отменен", **self.admin_auth)
+        self.assertEqual(DailyRevenue.objects.get().revenue, 0)
+        self.assertEqual(CategoryRevenue.objects.get(category=self.category).items, 0)
+
+        self.client.put("/api/orders/status", data={"status": "Новый", "ids": [order.id]},
+                        content_type="application/json", **self.admin_auth)
+        self.assertEqual(ProductRevenue.objects.get(product=self.product).revenue, 3000)
+
+    def test_stats_follow_deletes(self):
+        kettle = Product.objects.create(title="Чайник", category=self.category, price=200, description="")
+        WishList.objects.create(user=self.user, product=kettle, count=1)
+        self.client.post("/api/order", **self.user_auth)
+        self.assertEqual(DailyRevenue.objects.values_list("revenue", "orders", "items").get(), (1200, 1, 2))
+        self.assertEqual(ProductPair.objects.count(), 2)
+
+        kettle.delete()
+        self.assertEqual(DailyRevenue.objects.values_list("revenue", "orders", "items").get(), (1000, 1, 1))
+        self.assertEqual(CategoryRevenue.objects.get(category=self.category).revenue, 1000)
+        self.assertEqual(ProductPair.objects.count(), 0)
+
+        Order.objects.latest("id").delete()
+        self.assertEqual(DailyRevenue.objects.values_list("revenue", "orders", "items").get(), (0, 0, 0))
+        self.assertEqual(CategoryRevenue.objects.get(category=self.category).revenue, 0)
+        self.assertEqual(ProductRevenue.objects.get(product=self.product).revenue, 0)
+
+    def test_product_save_without_select(self):
+        product = Product.objects.get(id=self.product.id)
+        product.price = 1500
+        with self.assertNumQueries(1):
+            product.save()
+        self.assertEqual((product._old_category_id, product._old_price), (self.category.id, 1000))
+
+    def test_import_category_move_refreshes_old_category(self):
+        refresh_category_stats([self.category.id])
+        self.assertEqual(CategoryStats.objects.get(category=self.category).product_count, 1)
+        line = {"id": self.product.id, "title": "Диван", "category": "mebel", "price": 500}
+        upload = SimpleUploadedFile("feed.ndjson", json.dumps(line, ensure_ascii=False).encode("utf-8"))
+        self.client.post("/api/products/import", data={"file": upload}, **self.admin_auth)
+        self.assertEqual(CategoryStats.objects.get(category=self.category).product_count, 0)
+        self.assertEqual(CategoryStats.objects.get(category__slug="mebel").product_count, 1)
+
+    def test_rebuild_stats(self):
+        call_command("rebuild_stats", stdout=StringIO())
+        self.assertEqual(DailyRevenue.objects.get().revenue, 1000)
+        response = self.client.get("/api/stats/revenue/products", **self.admin_auth)
+        self.assertEqual(response.json(), [{"product_id": self.product.id, "revenue": 1000, "items": 1}])
+        self.assertEqual(CategoryStats.objects.get(category=self.category).product_count, 1)
+
+    def test_related_follow_orders(self):
+        kettle = Product.objects.create(title="Чайник", category=self.category, price=100, description="")
+        cup = Product.objects.create(title="Кружка", category=self.category, price=50, description="")
+        WishList.objects.create(user=self.user, product=kettle, count=1)
+        WishList.objects.create(user=self.user, product=cup, count=1)
+        self.client.post("/api/order", **self.user_auth)
+        WishList.objects.create(user=self.user, product=self.product, count=1)
+        WishList.objects.create(user=self.user, product=cup, count=1)
+        self.client.post("/api/order", **self.user_auth)
+        second = Order.objects.latest("id")
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/product/{self.product.id}/related")
+        self.assertEqual([product["id"] for product in response.json()], [cup.id, kettle.id])
+        self.assertEqual(response.json()[0]["title"], "Кружка")
+        self.assertEqual(RelatedProduct.objects.get(product=cup, rank=1).count, 2)
+
+        self.client.put(f"/api/order/{second.id}/status/Отменен", **self.admin_auth)
+        response = self.client.get(f"/api/product/{self.product.id}/related")
+        self.assertEqual([product["id"] for product in response.json()], [kettle.id, cup.id])
+        self.assertEqual(ProductPair.objects.filter(count__lte=0).count(), 0)
+        self.client.put("/api/orders/status", data={"status": "Новый", "ids": [second.id]},
+                        content_type="application/json", **self.admin_auth)
+        response = self.client.get(f"/api/product/{self.product.id}/related")
+        self.assertEqual([product["id"] for product in response.json()], [cup.id, kettle.id])
+        self.assertEqual(self.client.get("/api/product/0/related").json(), [])
+
+    def test_rebuild_related(self):
+        lamp = Product.objects.create(title="Лампа", category=self.category, price=200, description="")
+        OrderProduct.objects.create(order=self.order, product=lamp, count=1, price=200)
+        cancelled = Order.objects.create(user=self.user, status="Отменен")
+        OrderProduct.objects.bulk_create([
+            OrderProduct(order=cancelled, product=self.product, count=1, price=1000),
+            OrderProduct(order=cancelled, product=lamp, count=1, price=200),
+        ])
+        call_command("rebuild_related", stdout=StringIO())
+        self.assertEqual(ProductPair.objects.get(product=lamp, related=self.product).count, 1)
+        response = self.client.get(f"/api/product/{lamp.id}/related")
+        self.assertEqual([product["id"] for product in response.json()], [self.product.id])
+        self.assertEqual(RelatedProduct.objects.count(), 2)
+        kettle = Product.objects.create(title="Чайник", category=self.category, price=100, description="")
+        OrderProduct.objects.create(order=self.order, product=kettle, count=1, price=100)
+        pairs = rebuild_related(range_size=1)
+        self.assertEqual(pairs, 6)
+        self.assertEqual(ProductPair.objects.filter(product=kettle).count(), 2)
+        self.assertEqual(sorted(RelatedProduct.objects.filter(product=self.product).values_list("related_id", flat=True)),
+                         [lamp.id, kettle.id])
+
+    def test_category_stats_follow_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title="Дешевый", category=self.category, price=10, description="")
+        stats = self.client.get("/api/stats/categories").json()
+        self.assertEqual(stats, [{"category_id": self.category.id, "product_count": 2,
+                                  "price_min": 10, "price_max": 1000, "price_avg": 505.0}])
+        other = Category.objects.create(title="Другая", slug="other")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.category = other
+            self.product.save()
+        self.assertEqual(CategoryStats.objects.get(category=self.category).price_max, 10)
+        self.assertEqual(CategoryStats.objects.get(category=other).product_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(CategoryStats.objects.filter(category_id=other.id).exists())
+
+    def test_stats_no_permission(self):
+        response = self.client.get("/api/stats/revenue/daily", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_permission_cache(self):
+        permission = Permission.objects.get(codename="view_user")
+        self.user.user_permissions.add(permission)
+        self.client.get("/api/users", **self.user_auth)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/users", **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in captured.captured_queries if "auth_permission" in q["sql"]])
+        self.assertEqual(permission_cache.stats()["hits"], 1)
+
+        self.user.user_permissions.remove(permission)
+        response = self.client.get("/api/users", **self.user_auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_permission_cache_group_change(self):
+        group = Group.objects.create(name="Менеджеры")
+        self.user.groups.add(group)
+        self.assertEqual(self.client.get("/api/users", **self.user_auth).status_code, 403)
+        group.permissions.add(Permission.objects.get(codename="view_user"))
+        self.assertEqual(self.client.get("/api/users", **self.user_auth).status_code, 200)
+
+    def test_fast_path_wire_format(self):
+        expected = json.loads(json.dumps([OrderOut.from_orm(self.order).dict()], cls=NinjaJSONEncoder))
+        self.assertEqual(self.client.get("/api/orders", **self.user_auth).json(), expected)
+        self.assertEqual(self.client.get("/api/orders?fast=true", **self.user_auth).json(), expected)
+        expected = json.loads(json.dumps([WishListOut.from_orm(self.wishlist_item).dict()], cls=NinjaJSONEncoder))
+        self.assertEqual(self.client.get("/api/wishlist", **self.user_auth).json(), expected)
+        self.assertEqual(self.client.get("/api/wishlist?fast=true", **self.user_auth).json(), expected)
+        OrderProduct.objects.create(order=self.order, product=self.product, count=2, price=900)
+        expected = self.client.get(f"/api/order/{self.order.id}", **self.user_auth).json()
+        self.assertEqual(expected[0]["product"]["title"], "Тестовый продукт")
+        self.assertEqual(self.client.get(f"/api/order/{self.order.id}?fast=true", **self.user_auth).json(), expected)
+        expected = self.client.get("/api/products/filter?max_price=5000").json()
+        self.assertEqual(expected, [ProductOut.from_orm(self.product).dict()])
+        self.assertEqual(self.client.get("/api/products/filter?max_price=5000&fast=true").json(), expected)
+        response = self.client.get("/api/products?stream=true")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), ProductOut.from_orm(self.product).dict())
+
+    def test_list_routes_validate_schema_by_default(self):
+        urls = [
+            ("/api/products", {}),
+            ("/api/categories", {}),
+            (f"/api/category/{self.category.slug}/products/", {}),
+            ("/api/users", self.admin_auth),
+            ("/api/async/products", {}),
+            ("/api/async/categories", {}),
+            (f"/api/async/category/{self.category.slug}/products/", {}),
+        ]
+        with mock.patch("onlineStore.pagination.render_rows", wraps=render_rows) as render:
+            for url, auth in urls:
+                expected = self.client.get(url, **auth).json()
+                self.assertFalse(render.called, url)
+                self.assertEqual(self.client.get(f"{url}?fast=true", **auth).json(), expected)
+                self.assertTrue(render.called, url)
+                render.reset_mock()
+            self.client.get("/api/products?fields=title")
+            self.assertTrue(render.called)
+        self.assertEqual(self.client.get("/api/products").json(), [ProductOut.from_orm(self.product).dict()])
+
+    def test_gzip_compression(self):
+        Product.objects.bulk_create(
+            Product(title=f"Продукт {i}", category=self.category, price=100, description="Описание") for i in range(50)
+        )
+        plain = self.client.get("/api/products")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        response = self.client.get("/api/products", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        response = self.client.get("/api/products", HTTP_ACCEPT_ENCODING="gzip, deflate", HTTP_IF_NONE_MATCH=plain["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get("/api/products", HTTP_ACCEPT_ENCODING="gzip;q=0, *")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get(f"/api/product/{self.product.id}", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_gzip_compression_stream(self):
+        response = self.client.get("/api/products?stream=true", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        line = json.loads(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(line["id"], self.product.id)
+
+    def get_tokens(self, username, password):
+        payload = {"username": username, "password": password}
+        return self.client.post("/api/auth/token", data=payload, content_type="application/json").json()
+
+    def test_token_auth(self):
+        tokens = self.get_tokens("testuser", "user1234")
+        self.assertEqual(tokens["token_type"], "bearer")
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {tokens['access_token']}"}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/auth/check", **bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("testuser", response.json()["message"])
+        self.assertEqual(len(captured), 0)
+        self.assertEqual(len(self.client.get("/api/wishlist", **bearer).json()), 1)
+        response = self.client.post("/api/category", data={"title": "Новая", "slug": "new"},
+                                    content_type="application/json", **bearer)
+        self.assertEqual(response.status_code, 403)
+
+        admin_bearer = {"HTTP_AUTHORIZATION": f"Bearer {self.get_tokens('testadmin', 'admin1234')['access_token']}"}
+        response = self.client.post("/api/category", data={"title": "Новая", "slug": "new"},
+                                    content_type="application/json", **admin_bearer)
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_invalid(self):
+        response = self.client.post("/api/auth/token", data={"username": "testuser", "password": "wrong"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        access = self.get_tokens("testuser", "user1234")["access_token"]
+        response = self.client.get("/api/auth/check", HTTP_AUTHORIZATION=f"Bearer {access[:-2]}xx")
+        self.assertEqual(response.status_code, 401)
+        with mock.patch("onlineStore.tokens.ACCESS_TTL", -1):
+            response = self.client.get("/api/auth/check", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_refresh_and_revoke(self):
+        tokens = self.get_tokens("testuser", "user1234")
+        response = self.client.post("/api/auth/token/refresh", data={"refresh_token": tokens["refresh_token"]},
+                                    content_type="application/json")
+        refreshed = response.json()
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {refreshed['access_token']}"}
+        self.assertEqual(self.client.get("/api/auth/check", **bearer).status_code, 200)
+
+        self.assertEqual(self.client.post("/api/auth/token/revoke", **bearer).status_code, 200)
+        self.assertEqual(self.client.get("/api/auth/check", **bearer).status_code, 401)
+        response = self.client.post("/api/auth/token/refresh", data={"refresh_token": refreshed["refresh_token"]},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_revoked_in_other_process(self):
+        tokens = self.get_tokens("testuser", "user1234")
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {tokens['access_token']}"}
+        self.assertEqual(self.client.get("/api/auth/check", **bearer).status_code, 200)
+        # Отзыв в другом процессе пишет только в БД; здесь он виден после GENERATION_TTL или перезапуска
+        AuthGeneration.objects.filter(id=self.user.id).update(generation=100)
+        response = self.client.post("/api/auth/token/refresh", data={"refresh_token": tokens["refresh_token"]},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        generation_cache.clear()
+        self.assertEqual(self.client.get("/api/auth/check", **bearer).status_code, 401)
+
+    def test_token_revoked_on_permission_change(self):
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {self.get_tokens('testuser', 'user1234')['access_token']}"}
+        self.user.user_permissions.add(Permission.objects.get(codename="view_user"))
+        self.assertEqual(self.client.get("/api/auth/check", **bearer).status_code, 401)
+        bearer = {"HTTP_AUTHORIZATION": f"Bearer {self.get_tokens('testuser', 'user1234')['access_token']}"}
+        self.assertEqual(self.client.get("/api/users", **bearer).status_code, 200)
+
+    def test_get_products_batch(self):
+        other = Product.objects.create(title="Другой", category=self.category, price=10, description="")
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f"/api/products/batch?ids={other.id}&ids=999&ids={self.product.id}&ids={other.id}")
+        self.assertEqual([product["id"] for product in response.json()], [other.id, self.product.id])
+        self.assertEqual(len(captured), 1)
+        response = self.client.get(f"/api/products/batch?ids={other.id}&fields=price,title")
+        self.assertEqual(response.json(), [{"id": other.id, "title": "Другой", "price": 10}])
+
+    def test_get_products_fields(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/products?fields=title")
+        self.assertEqual(response.json(), [{"id": self.product.id, "title": "Тестовый продукт"}])
+        self.assertNotIn("description", captured.captured_queries[0]["sql"])
+        response = self.client.get("/api/products/filter?min_price=500&fields=price")
+        self.assertEqual(response.json(), [{"id": self.product.id, "price": 1000}])
+        response = self.client.get("/api/category/test-category/products/?fields=title,price")
+        self.assertEqual(list(response.json()[0]), ["id", "title", "price"])
+        response = self.client.get("/api/products?fields=title,secret")
+        self.assertEqual(response.status_code, 400)
+
+    def test_price_index_filter(self):
+        other = Category.objects.create(title="Другая", slug="other")
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap = Product.objects.create(title="Дешевый", category=other, price=10, description="")
+        response = self.client.get("/api/products/filter?max_price=500")
+        self.assertEqual([product["id"] for product in response.json()], [cheap.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.price = 2000
+            cheap.save()
+            Product.objects.create(title="Средний", category=self.category, price=1500, description="")
+        response = self.client.get(f"/api/products/filter?min_price=1000&category_id={self.category.id}&fields=price")
+        self.assertEqual([product["price"] for product in response.json()], [1000, 1500])
+        response = self.client.get("/api/products/filter?min_price=1000&max_price=1999")
+        self.assertEqual([product["price"] for product in response.json()], [1000, 1500])
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.delete()
+        self.assertEqual(price_index.lookup(min_price=2000), [])
+        self.assertEqual(price_index.check(), {"products": 2, "missing": [], "extra": []})
+
+    def test_price_index_check(self):
+        price_index.lookup()
+        product = Product.objects.bulk_create([Product(title="Мимо сигналов", category=self.category, price=5, description="")])[0]
+        self.assertEqual(price_index.check()["missing"], [product.id])
+        price_index.invalidate()
+        self.assertEqual(price_index.lookup(max_price=5), [product.id])
+
+    def test_price_index_etag_and_fallback(self):
+        response = self.client.get("/api/products/filter?max_price=5000")
+        etag = response["ETag"]
+        product = Product.objects.bulk_create([Product(title="Мимо сигналов", category=self.category, price=5, description="")])[0]
+        self.assertEqual(self.client.get("/api/products/filter?max_price=5000", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        price_index.invalidate()
+        with price_index._build_lock:
+            response = self.client.get("/api/products/filter?max_price=5000", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.json()], [product.id, self.product.id])
+        self.assertEqual(price_index.stats()["built"], False)
+        response = self.client.get("/api/products/filter?max_price=5000", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIsNone(price_index.lookup(limit=1))
+        self.assertEqual(price_index.lookup(limit=2), [product.id, self.product.id])
+
+    def test_price_index_changes_during_build(self):
+        build = price_index.build
+
+        def build_with_changes():
+            result = build()
+            price_index.move(self.product.id, (self.category.id, 1000), (self.category.id, 7))
+            return result
+
+        with mock.patch.object(price_index, "build", build_with_changes):
+            self.assertTrue(price_index.ensure())
+        self.assertEqual(price_index.lookup(max_price=10), [self.product.id])
+
+        def build_with_invalidate():
+            result = build()
+            price_index.invalidate()
+            return result
+
+        price_index.invalidate()
+        with mock.patch.object(price_index, "build", build_with_invalidate):
+            self.assertFalse(price_index.ensure())
+        self.assertFalse(price_index.stats()["built"])
+
+    def test_products_suggest(self):
+        popular = Product.objects.create(title="Ёлка искусственная", category=self.category, price=3000, description="")
+        rare = Product.objects.create(title="Елочные игрушки", category=self.category, price=300, description="")
+        ProductRevenue.objects.create(product=popular, items=5, revenue=15000)
+        with mock.patch.object(suggest_index, "rebuild_in_background") as rebuild:
+            self.assertEqual(self.client.get("/api/products/suggest?q=ЕЛ").json(), [])
+        rebuild.assert_called_once()
+        suggest_index.rebuild()
+        response = self.client.get("/api/products/suggest?q=ЕЛ")
+        self.assertEqual(response.json(), [
+            {"id": popular.id, "title": "Ёлка искусственная"},
+            {"id": rare.id, "title": "Елочные игрушки"},
+        ])
+        response = self.client.get("/api/products/suggest?q=искус")
+        self.assertEqual([product["id"] for product in response.json()], [popular.id])
+        response = self.client.get("/api/products/suggest?q=ел&limit=1")
+        self.assertEqual([product["id"] for product in response.json()], [popular.id])
+        self.assertEqual(self.client.get("/api/products/suggest?q=%20").json(), [])
+        self.assertEqual(self.client.get("/api/products/suggest?q=лка").json(), [])
+
+    def test_products_suggest_updates(self):
+        suggest_index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Product.objects.create(title="Тестовый чайник", category=self.category, price=100, description="")
+            ProductRevenue.objects.create(product=new, items=3, revenue=300)
+            new.save()
+        response = self.client.get("/api/products/suggest?q=тест")
+        self.assertEqual([product["id"] for product in response.json()], [new.id, self.product.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "Переименованный продукт"
+            self.product.save()
+        self.assertEqual([product["id"] for product in self.client.get("/api/products/suggest?q=тест").json()], [new.id])
+        self.assertEqual(len(self.client.get("/api/products/suggest?q=пере").json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            new.delete()
+        self.assertEqual(self.client.get("/api/products/suggest?q=тест").json(), [])
+        suggest_index.rebuild()
+        self.assertEqual(suggest_index.stats()["pending"], 0)
+        self.assertEqual(self.client.get("/api/products/suggest?q=чай").json(), [])
+
+    def test_suggest_changes_during_build(self):
+        def rows():
+            yield self.product.id, self.product.title, 0
+            suggest_index.update(self.product.id + 1, "Тестовая лампа", 1)
+            suggest_index.remove(self.product.id)
+
+        suggest_index.rebuild(rows())
+        self.assertEqual(suggest_index.suggest("тест"), [{"id": self.product.id + 1, "title": "Тестовая лампа"}])
+        table = TitleTable([(1, "Ёлка Зелёная", 0), (2, "Елка", 0), (3, "Ель", 0)])
+        self.assertEqual([table.title(product) for product in table.top("ел")], ["Елка", "Ёлка Зелёная", "Ель"])
+        self.assertEqual(list(table.top("зел")), [0])
+        self.assertEqual(list(table.top("елка з")), [0])
+        # 4 массива по продуктам и 4 по ключам (дерево - два int на ключ) плюс оба буфера
+        self.assertEqual(table.nbytes(), 3 * 4 * 8 + 4 * (8 + 4 + 8 + 2 * 4) + len("Ёлка ЗелёнаяЕлкаЕль".encode()) + len("елка зеленаяелкаель".encode()))
+
+
+class QueryBudgetTest(TestCase):
+    # Число запросов к БД на эндпоинт не должно зависеть от числа строк в ответе
+    ROWS = 10
+
+    def setUp(self):
+        credential_cache.clear()
+        permission_cache.clear()
+        generation_cache.clear()
+        price_index.invalidate()
+        suggest_index.invalidate()
+        self.client = Client()
+        self.user = User.objects.create_user(username="testuser", password="user1234")
+        self.user_auth = get_http_authorization("testuser", "user1234")
+        category = Category.objects.create(title="Тестовая категория", slug="test-category")
+        for i in range(self.ROWS):
+            product = Product.objects.create(title=f"Продукт {i}", category=category, price=100, description="")
+            WishList.objects.create(user=self.user, product=product, count=1)
+            self.order = Order.objects.create(user=self.user, status="Новый", total=100)
+        for product in Product.objects.all():
+            OrderProduct.objects.create(order=self.order, product=product, count=1, price=100)
+        self.client.get("/api/auth/check", **self.user_auth)
+
+    def assertQueryBudget(self, url, budget, rows):
+        # Первый запрос читает поколения для ETag (cache.Generation), бюджет считается по второму
+        self.client.get(url, **self.user_auth)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **self.user_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), rows)
+        self.assertLessEqual(len(queries), budget, "\n".join(q["sql"] for q in queries))
+
+    def test_get_wishlist_budget(self):
+        self.assertQueryBudget("/api/wishlist", 1, self.ROWS)
+
+    def test_get_orders_budget(self):
+        self.assertQueryBudget("/api/orders", 1, self.ROWS)
+
+    def test_get_order_budget(self):
+        self.assertQueryBudget(f"/api/order/{self.order.id}", 2, self.ROWS)
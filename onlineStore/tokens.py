@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import transaction
+from ninja.security import HttpBearer
+from .lru import TTLCache
+from .models import AuthGeneration
+from .stats import increment
+
+
+# Подписанные токены доступа вместо BasicAuth на каждый запрос.
+# Токен - django.core.signing (HMAC-SHA256 от SECRET_KEY) с id пользователя, снимком прав и поколением.
+# Проверка токена доступа не хэширует пароль: нужны только подпись, срок жизни и поколения.
+# Поколения хранятся в БД (AuthGeneration): поколение пользователя увеличивается при отзыве токенов
+# и сигналами (signals.py) при изменении пользователя и его прав, общее поколение - при изменении прав групп.
+# Процесс держит прочитанные поколения GENERATION_TTL секунд, поэтому отзыв в другом процессе
+# виден не позже чем через GENERATION_TTL; свой процесс сбрасывает их сразу и после коммита.
+# Токен обновления всегда сверяется с БД.
+
+_config = getattr(settings, "API_TOKENS", {})
+
+ACCESS_TTL = _config.get("ACCESS_TTL", 900)
+REFRESH_TTL = _config.get("REFRESH_TTL", 7 * 24 * 3600)
+GENERATION_TTL = _config.get("GENERATION_TTL", 5)
+GENERATION_CACHE_SIZE = _config.get("GENERATION_CACHE_SIZE", 10_000)
+
+ACCESS_SALT = "onlineStore.tokens.access"
+REFRESH_SALT = "onlineStore.tokens.refresh"
+GLOBAL_GENERATION = 0
+
+generation_cache = TTLCache(max_size=GENERATION_CACHE_SIZE, ttl=GENERATION_TTL)
+
+
+def read_generations(user_id):
+    values = dict(AuthGeneration.objects.filter(id__in=[GLOBAL_GENERATION, user_id]).values_list("id", "generation"))
+    return [values.get(GLOBAL_GENERATION, 0), values.get(user_id, 0)]
+
+
+def get_generations(user_id, fresh=False):
+    generations = None if fresh else generation_cache.get(user_id)
+    if generations is None:
+        generations = read_generations(user_id)
+        generation_cache.set(user_id, generations)
+    return generations
+
+
+def forget_generations(key):
+    if key == GLOBAL_GENERATION:
+        generation_cache.clear()
+    else:
+        generation_cache.pop(key)
+
+
+def bump_generation(key):
+    increment(AuthGeneration, ["id"], [(key, 1)], ["generation"])
+    # Сразу и после коммита: до коммита другой поток мог перечитать и закэшировать старое значение
+    forget_generations(key)
+    transaction.on_commit(lambda: forget_generations(key))
+
+
+def revoke_user_tokens(user_id):
+    bump_generation(user_id)
+
+
+def revoke_all_tokens():
+    bump_generation(GLOBAL_GENERATION)
+
+
+def issue_tokens(user):
+    generation = get_generations(user.pk)
+    access = {
+        "uid": user.pk,
+        "username": user.username,
+        "gen": generation,
+        "su": user.is_superuser,
+        "staff": user.is_staff,
+        "perms": [] if user.is_superuser else sorted(user.get_all_permissions()),
+    }
+    return {
+        "access_token": signing.dumps(access, salt=ACCESS_SALT, compress=True),
+        "refresh_token": signing.dumps({"uid": user.pk, "gen": generation}, salt=REFRESH_SALT),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TTL,
+    }
+
+
+def load_token(token, salt, max_age, fresh=False):
+    # None, если подпись не сошлась, срок истек или токен отозван
+    try:
+        payload = signing.loads(token, salt=salt, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    if payload.get("gen") != get_generations(payload.get("uid"), fresh):
+        return None
+    return payload
+
+
+def token_user(payload):
+    # Пользователь без обращения к БД: права берутся из снимка в токене
+    user = User(
+        id=payload["uid"],
+        username=payload["username"],
+        is_active=True,
+        is_superuser=payload["su"],
+        is_staff=payload["staff"],
+    )
+    user._perm_cache = set(payload["perms"])
+    return user
+
+
+def refresh_tokens(refresh_token):
+    payload = load_token(refresh_token, REFRESH_SALT, REFRESH_TTL, fresh=True)
+    if payload is None:
+        return None
+    user = User.objects.filter(id=payload["uid"], is_active=True).first()
+    if user is None:
+        return None
+    return issue_tokens(user)
+
+
+class TokenAuth(HttpBearer):
+    def __call__(self, request):
+        # Заголовки других схем (Basic) пропускаются молча, их проверит следующий класс в auth
+        scheme, _, token = request.headers.get(self.header, "").partition(" ")
+        if scheme.lower() != self.openapi_scheme or not token:
+            return None
+        return self.authenticate(request, token)
+
+    def authenticate(self, request, token):
+        payload = load_token(token, ACCESS_SALT, ACCESS_TTL)
+        if payload is None:
+            return None
+        return token_user(payload)
@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.urls import path
 from .api import api
+from .api_async import router as async_router
+from .metrics import instrument_operations
 from . import views
 
 
+api.add_router("async/", async_router)
+instrument_operations(api)
+
+
 urlpatterns = [
     path('', views.home),
     path('api/', api.urls),